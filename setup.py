@@ -17,7 +17,7 @@ setup(
     name="TrebuchetTrigger",
     version="0.5.4",
     packages=find_packages(),
-    install_requires=['GitPython>=0.3.2.RC1', 'PyYAML>=3.10', 'redis>=2.4.9'],
+    install_requires=['GitPython>=0.3.2.RC1', 'PyYAML>=3.10', 'redis>=2.10'],
 
     author="Ryan Lane",
     author_email="ryan@ryandlane.com",
@@ -30,6 +30,7 @@ setup(
             'git-trigger = trigger.shell:main',
             'git-deploy = trigger.shell:main',
             'trigger-submodule-update = trigger.utils.submodule_update:main',
+            'trigger-startup-time = trigger.utils.startup_time:main',
         ],
     },
 )
@@ -12,13 +12,10 @@
 #    under the License.
 
 import os
+import re
 import sys
-import yaml
+import json
 import logging
-import ConfigParser
-
-from git import InvalidGitRepositoryError
-from git.repo import Repo
 
 try:
     NullHandler = logging.NullHandler
@@ -41,19 +38,53 @@ class ConfigurationError(Exception):
         return self.message
 
 
+class Drivers(object):
+    """
+    Mapping of driver names to drivers. Drivers are imported and
+    instantiated on first access, so commands only pay for the drivers
+    they use.
+    """
+
+    def __init__(self, conf):
+        self._conf = conf
+        self._drivers = {}
+
+    def __getitem__(self, name):
+        if name not in self._drivers:
+            self._drivers[name] = self._conf.load_driver(name)
+        return self._drivers[name]
+
+
+SNAPSHOT_VERSION = 1
+
+# Matches the section headers and path values of git config include
+# sections, [include] and [includeIf "<condition>"].
+CONFIG_SECTION_RE = re.compile(r'^\s*\[\s*([^\]\s"]+)')
+CONFIG_PATH_RE = re.compile(r'^\s*path\s*=\s*(.*?)\s*$')
+
+
 class Configuration(object):
 
     config = {}
-    drivers = {}
+    # The level each configuration item was loaded from, or 'default'
+    config_origins = {}
     _config_levels = ['system', 'global', 'trigger', 'repository']
 
     def __init__(self):
+        # GitPython is slow to import, so only import it once a command
+        # needs the repository.
+        from git import InvalidGitRepositoryError
+        from git.repo import Repo
+
         try:
             self.repo = Repo('.')
         except InvalidGitRepositoryError:
             msg = 'Not in a git repository'
             raise ConfigurationError(msg, 1)
-        self._load_config()
+        self.drivers = Drivers(self)
+        # The config files are only read when a key isn't in the snapshot.
+        self._repo_config = None
+        self._load_snapshot()
         self._missing_config = []
         config = {
             'deploy.repo-name': {
@@ -63,6 +94,46 @@ class Configuration(object):
                 'required': False,
                 'default': None,
             },
+            'deploy.tag-retention-count': {
+                'required': False,
+                'default': None,
+            },
+            'deploy.tag-retention-days': {
+                'required': False,
+                'default': None,
+            },
+            'deploy.gc-after-finish': {
+                'required': False,
+                'default': False,
+            },
+            'deploy.dirty-check': {
+                'required': False,
+                'default': 'full',
+            },
+            'deploy.dirty-check-fsmonitor': {
+                'required': False,
+                'default': False,
+            },
+            'deploy.metrics-sinks': {
+                'required': False,
+                'default': None,
+            },
+            'deploy.metrics-statsd-host': {
+                'required': False,
+                'default': 'localhost',
+            },
+            'deploy.metrics-statsd-port': {
+                'required': False,
+                'default': 8125,
+            },
+            'deploy.metrics-statsd-prefix': {
+                'required': False,
+                'default': 'trigger',
+            },
+            'deploy.metrics-file': {
+                'required': False,
+                'default': None,
+            },
             'user.name': {
                 'required': True,
             },
@@ -73,21 +144,159 @@ class Configuration(object):
         self._register_config(config)
         self.register_drivers()
 
+    def _read_git_config(self, level):
+        # Read every item of a git config level into a flat dict, parsing
+        # the file once.
+        reader = self.repo.config_reader(level)
+        values = {}
+        for section in reader.sections():
+            for name, _ in reader.items(section):
+                key = '{0}.{1}'.format(section, name)
+                values[key] = reader.get_value(section, name)
+        return values
+
     def _load_config(self):
+        import yaml
+
         self._repo_config = {}
-        self._repo_config['system'] = self.repo.config_reader('system')
-        self._repo_config['global'] = self.repo.config_reader('global')
+        self._repo_config['system'] = self._read_git_config('system')
+        self._repo_config['global'] = self._read_git_config('global')
+        self._repo_config['trigger'] = {}
         try:
             f = open(os.path.join(self.repo.working_dir, '.trigger'), 'r')
             trigger_config = f.read()
             f.close()
-            self._repo_config['trigger'] = yaml.safe_load(trigger_config)
+            trigger_config = yaml.safe_load(trigger_config)
+            if isinstance(trigger_config, dict):
+                self._repo_config['trigger'] = trigger_config
         except (IOError, OSError):
-            self._repo_config['trigger'] = {}
-        except (ValueError, KeyError):
+            pass
+        except (ValueError, KeyError, yaml.YAMLError):
             LOG.warning('Found a .trigger config file, but could not parse'
                         ' it. Unable to load repo specific config.')
-        self._repo_config['repository'] = self.repo.config_reader('repository')
+        self._repo_config['repository'] = self._read_git_config('repository')
+
+    def _get_included_files(self, path, seen):
+        # Returns the files included by a git config file, recursively.
+        # Conditional includes are listed whether or not they apply, which
+        # can only cause extra invalidations.
+        try:
+            f = open(path, 'r')
+            lines = f.readlines()
+            f.close()
+        except (IOError, OSError):
+            return []
+        included = []
+        section = None
+        for line in lines:
+            match = CONFIG_SECTION_RE.match(line)
+            if match:
+                section = match.group(1).lower()
+                continue
+            if section not in ['include', 'includeif']:
+                continue
+            match = CONFIG_PATH_RE.match(line)
+            if not match:
+                continue
+            include = os.path.expanduser(match.group(1).strip('"'))
+            if not os.path.isabs(include):
+                include = os.path.join(os.path.dirname(path), include)
+            if include in seen:
+                continue
+            seen.add(include)
+            included.append(include)
+            included.extend(self._get_included_files(include, seen))
+        return included
+
+    def _get_config_files(self):
+        xdg_config_home = os.environ.get('XDG_CONFIG_HOME',
+                                         os.path.join(os.path.expanduser('~'),
+                                                      '.config'))
+        git_files = ['/etc/gitconfig',
+                     os.path.join(xdg_config_home, 'git', 'config'),
+                     os.path.expanduser('~/.gitconfig'),
+                     os.path.join(self.repo.git_dir, 'config')]
+        files = list(git_files)
+        seen = set(git_files)
+        for path in git_files:
+            files.extend(self._get_included_files(path, seen))
+        files.append(os.path.join(self.repo.working_dir, '.trigger'))
+        return files
+
+    def _get_snapshot_key(self):
+        # Any change to a config file invalidates the snapshot.
+        key = {}
+        for path in self._get_config_files():
+            try:
+                stat = os.stat(path)
+                key[path] = [stat.st_mtime, stat.st_size]
+            except OSError:
+                key[path] = None
+        return key
+
+    def _load_snapshot(self):
+        self._snapshot_file = os.path.join(self.repo.git_dir, 'deploy',
+                                           'config-snapshot')
+        self._snapshot_key = self._get_snapshot_key()
+        self._snapshot = {}
+        self._snapshot_changed = False
+        try:
+            f = open(self._snapshot_file, 'r')
+            snapshot = json.loads(f.read())
+            f.close()
+        except (IOError, OSError, ValueError):
+            return
+        if (snapshot.get('version') != SNAPSHOT_VERSION or
+                snapshot.get('key') != self._snapshot_key):
+            return
+        for key, found in snapshot['values'].items():
+            if found is not None:
+                level, value = found
+                if isinstance(value, unicode):
+                    value = value.encode('utf-8')
+                found = (str(level), value)
+            self._snapshot[str(key)] = found
+
+    def _save_snapshot(self):
+        if not self._snapshot_changed:
+            return
+        snapshot = {'version': SNAPSHOT_VERSION,
+                    'key': self._snapshot_key,
+                    'values': self._snapshot}
+        tmp_file = '{0}.{1}'.format(self._snapshot_file, os.getpid())
+        try:
+            data = json.dumps(snapshot)
+            deploy_dir = os.path.dirname(self._snapshot_file)
+            if not os.path.isdir(deploy_dir):
+                os.mkdir(deploy_dir)
+            # The snapshot can hold secrets read from a user's private
+            # config, such as deploy.redis-password, so only the user may
+            # read it.
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o600)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            os.rename(tmp_file, self._snapshot_file)
+            self._snapshot_changed = False
+        except (TypeError, ValueError, IOError, OSError):
+            LOG.debug('Could not write the configuration snapshot')
+
+    def _lookup_config(self, key):
+        # Returns the (level, value) of the highest precedence level that
+        # sets key, or None if it isn't set at any level.
+        if key in self._snapshot:
+            return self._snapshot[key]
+        if self._repo_config is None:
+            self._load_config()
+        found = None
+        for level in self._config_levels:
+            if key in self._repo_config[level]:
+                found = (level, self._repo_config[level][key])
+        self._snapshot[key] = found
+        self._snapshot_changed = True
+        return found
 
     def register_drivers(self):
         driver_config = {
@@ -108,46 +317,54 @@ class Configuration(object):
                 'default': 'trebuchet.local.ReportDriver'
             },
         }
+        # Drivers themselves are loaded on first access through
+        # self.drivers; see load_driver.
         self._register_config(driver_config)
-        for driver in driver_config:
-            driver_config = self.config[driver]
-            driver_name = driver.split('.')[1]
-            LOG.debug('Getting config for driver: {}'.format(driver_name))
-            mod, _, cls = driver_config.rpartition('.')
-            mod = 'trigger.drivers.' + mod
-            try:
-                LOG.debug('Importing {}'.format(mod))
-                __import__(mod)
-                driver_class = getattr(sys.modules[mod], cls)
-                self.drivers[driver_name] = driver_class(self)
-                self._register_config(self.drivers[driver_name].get_config())
-            except (ValueError, AttributeError):
-                msg = 'Failed to import driver: {0}'.format(mod)
-                raise ConfigurationError(msg, 1)
+
+    def load_driver(self, driver_name):
+        driver_config = self.config['deploy.{0}'.format(driver_name)]
+        LOG.debug('Getting config for driver: {}'.format(driver_name))
+        mod, _, cls = driver_config.rpartition('.')
+        mod = 'trigger.drivers.' + mod
+        try:
+            LOG.debug('Importing {}'.format(mod))
+            __import__(mod)
+            driver_class = getattr(sys.modules[mod], cls)
+            driver = driver_class(self)
+            missing = self._register_config(driver.get_config())
+        except (ValueError, AttributeError):
+            msg = 'Failed to import driver: {0}'.format(mod)
+            raise ConfigurationError(msg, 1)
+        # The driver's configuration is only known once it is loaded, so
+        # check it now.
+        self.check_config(missing)
+        return driver
 
     def _register_config(self, config):
-        for level in self._config_levels:
-            repo_config = self._repo_config[level]
-            for key, item in config.items():
-                try:
-                    section, name = key.split('.')
-                    if level == 'trigger':
-                        self.config[key] = repo_config[key]
-                    else:
-                        self.config[key] = repo_config.get_value(section,
-                                                                 name)
-                except (KeyError,
-                        ConfigParser.NoOptionError,
-                        ConfigParser.NoSectionError):
-                    if 'default' in item:
-                        self.config[key] = item['default']
+        for key, item in config.items():
+            found = self._lookup_config(key)
+            if found is not None:
+                self.config_origins[key] = found[0]
+                self.config[key] = found[1]
+            elif 'default' in item:
+                self.config_origins[key] = 'default'
+                self.config[key] = item['default']
+        missing = []
         for key, item in config.items():
             if item['required'] and key not in self.config:
-                self._missing_config.append(key)
+                missing.append(key)
+        self._missing_config.extend(missing)
+        self._save_snapshot()
+        return missing
+
+    def get_missing_config(self):
+        return list(self._missing_config)
 
-    def check_config(self):
-        if self._missing_config:
-            for item in self._missing_config:
+    def check_config(self, missing=None):
+        if missing is None:
+            missing = self._missing_config
+        if missing:
+            for item in missing:
                 msg = ('Missing the following configuration item:'
                        ' {0}').format(item)
                 LOG.error(msg)
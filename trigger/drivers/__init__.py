@@ -45,6 +45,10 @@ class LockDriverError(Exception):
 
 class LockDriver(Driver):
 
+    # Seconds between refresh_lock calls while a sync runs, or None for no
+    # heartbeat.
+    heartbeat_interval = None
+
     def check_lock(self, args):
         raise NotImplementedError
 
@@ -54,6 +58,14 @@ class LockDriver(Driver):
     def remove_lock(self, args):
         raise NotImplementedError
 
+    def refresh_lock(self, args):
+        """Mark the lock as held by a running process and renew it."""
+        pass
+
+    def detach_lock(self, args):
+        """Mark the lock as no longer held by a running process."""
+        pass
+
 
 class ServiceDriverError(Exception):
 
@@ -79,6 +91,9 @@ class ServiceDriver(Driver):
     def reload(self, args):
         raise NotImplementedError
 
+    def get_restart_info(self):
+        raise NotImplementedError
+
 
 class ReportDriverError(Exception):
     def __init__(self, message, errorno):
@@ -93,3 +108,23 @@ class ReportDriver(Driver):
 
     def report(self, args):
         raise NotImplementedError
+
+    def get_sync_progress(self, tag, stage, pending_limit=0):
+        raise NotImplementedError
+
+    def watch_sync(self, tag, report_type='full', timeout=None, until=None):
+        raise NotImplementedError
+
+    def get_minions(self):
+        raise NotImplementedError
+
+    def get_stage_status(self, tag, stage, minions):
+        raise NotImplementedError
+
+    def report_service(self, since, detailed=False, pending_only=False,
+                       status=None, limit=None, sort=None,
+                       output_format='text'):
+        raise NotImplementedError
+
+    def watch_service(self, since, timeout=None):
+        raise NotImplementedError
@@ -12,14 +12,28 @@
 #    under the License.
 
 import os
+import sys
 import json
+import math
+import time
+import errno
+import fcntl
+import binascii
+import heapq
+import socket
+import itertools
+import threading
 import subprocess
 import trigger.config as config
 import trigger.drivers as drivers
+import trigger.metrics as metrics
 
 import redis
 
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
+from trigger.utils import submodule_update
+from trigger.drivers.trebuchet import transport
 from trigger.drivers import SyncDriverError
 from trigger.drivers import LockDriverError
 from trigger.drivers import ServiceDriverError
@@ -27,6 +41,210 @@ from trigger.drivers import ReportDriverError
 
 LOG = config.LOG
 
+REDIS_CONFIG = {
+    'deploy.redis-host': {
+        'required': False,
+        'default': 'localhost'
+    },
+    'deploy.redis-port': {
+        'required': False,
+        'default': 6379
+    },
+    'deploy.redis-db': {
+        'required': False,
+        'default': 0
+    },
+    'deploy.redis-unix-socket-path': {
+        'required': False,
+        'default': None
+    },
+    'deploy.redis-password': {
+        'required': False,
+        'default': None
+    },
+    'deploy.redis-socket-timeout': {
+        'required': False,
+        'default': None
+    },
+    'deploy.redis-socket-connect-timeout': {
+        'required': False,
+        'default': None
+    },
+}
+
+
+def get_redis_pool(conf):
+    """
+    Create a redis connection pool from the deploy.redis-* configuration.
+    Raises ValueError if the configuration is invalid.
+    """
+    def _get_timeout(key):
+        timeout = conf.config[key]
+        if timeout is None:
+            return None
+        try:
+            return float(timeout)
+        except (TypeError, ValueError):
+            raise ValueError('{0} must be a number'.format(key))
+
+    try:
+        db = int(conf.config['deploy.redis-db'])
+    except (TypeError, ValueError):
+        raise ValueError('deploy.redis-db must be an integer')
+    kwargs = {
+        'db': db,
+        'password': conf.config['deploy.redis-password'],
+        'socket_timeout': _get_timeout('deploy.redis-socket-timeout'),
+    }
+    # Only pass the connect timeout when it is set, as older versions of
+    # redis-py do not support it.
+    connect_timeout = _get_timeout('deploy.redis-socket-connect-timeout')
+    if connect_timeout is not None:
+        kwargs['socket_connect_timeout'] = connect_timeout
+    socket_path = conf.config['deploy.redis-unix-socket-path']
+    if socket_path:
+        kwargs['connection_class'] = redis.UnixDomainSocketConnection
+        kwargs['path'] = socket_path
+    else:
+        try:
+            kwargs['port'] = int(conf.config['deploy.redis-port'])
+        except (TypeError, ValueError):
+            raise ValueError('deploy.redis-port must be an integer')
+        kwargs['host'] = conf.config['deploy.redis-host']
+    return redis.ConnectionPool(**kwargs)
+
+
+# Counts the minions of a repo whose hash field (ARGV[2]) matches a tag
+# (ARGV[3]) inside of redis, so that a concise report is a single round
+# trip regardless of the number of minions. Returns the complete and pending
+# counts, followed by up to ARGV[4] pending minion names (-1 for all).
+AGGREGATE_SCRIPT = """
+local minions = redis.call('SMEMBERS', KEYS[1])
+local limit = tonumber(ARGV[4])
+local complete = 0
+local pending = 0
+local pending_minions = {}
+for _, minion in ipairs(minions) do
+    local value = redis.call('HGET', ARGV[1] .. minion, ARGV[2])
+    if value == ARGV[3] then
+        complete = complete + 1
+    else
+        pending = pending + 1
+        if limit < 0 or pending <= limit then
+            table.insert(pending_minions, minion)
+        end
+    end
+end
+return {complete, pending, pending_minions}
+"""
+
+# Counts the minions of a repo (KEYS[1]) whose last restart returned, is
+# running or hasn't started since a timestamp (ARGV[2]), and the statuses
+# returned, inside of redis. Returns the three counts, a flat list of
+# status/count pairs and up to ARGV[3] pending minion names (-1 for all).
+RESTART_AGGREGATE_SCRIPT = """
+local minions = redis.call('SMEMBERS', KEYS[1])
+local since = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local restarted = 0
+local restarting = 0
+local pending = 0
+local statuses = {}
+local pending_minions = {}
+for _, minion in ipairs(minions) do
+    local values = redis.call('HMGET', ARGV[1] .. minion, 'restart_status',
+                              'restart_checkin_timestamp',
+                              'restart_timestamp')
+    local checkin = tonumber(values[2]) or 0
+    local finished = tonumber(values[3]) or 0
+    if finished > 0 and finished >= since and finished >= checkin then
+        restarted = restarted + 1
+        local status = values[1] or 'None'
+        statuses[status] = (statuses[status] or 0) + 1
+    elseif checkin > 0 and checkin >= since then
+        restarting = restarting + 1
+    else
+        pending = pending + 1
+        if limit < 0 or pending <= limit then
+            table.insert(pending_minions, minion)
+        end
+    end
+end
+local status_counts = {}
+for status, count in pairs(statuses) do
+    table.insert(status_counts, status)
+    table.insert(status_counts, count)
+end
+return {restarted, restarting, pending, status_counts, pending_minions}
+"""
+
+# Minion hash fields that hold the tag a minion completed for each stage.
+STAGE_TAG_FIELDS = {'fetch': 'fetch_tag', 'checkout': 'tag'}
+
+# Bounds, in seconds, for the adaptive interval used when polling redis for
+# progress, either when watching reports without redis notifications or when
+# waiting on completion thresholds during automatic syncs.
+POLL_MIN_INTERVAL = 1
+POLL_MAX_INTERVAL = 15
+
+# Compare-and-delete and compare-and-renew for redis lock leases, on the
+# owner token (ARGV[1]) stored in the lease, so a deployer only ever
+# releases or renews a lease it acquired. Return 1 on success, 0 when no
+# lease is held and -1 when the lease is owned by another deployer.
+LOCK_OWNER_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return 0
+end
+local ok, info = pcall(cjson.decode, value)
+if not ok or type(info) ~= 'table' or info['token'] ~= ARGV[1] then
+    return -1
+end
+"""
+
+RELEASE_LOCK_SCRIPT = LOCK_OWNER_SCRIPT + """
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+RENEW_LOCK_SCRIPT = LOCK_OWNER_SCRIPT + """
+redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+return 1
+"""
+
+
+class RunnerCall(threading.Thread):
+    """
+    A runner call made in the background, so that progress can be reported
+    while the runner is still running.
+    """
+
+    def __init__(self, run, fun, arg, minions=None):
+        threading.Thread.__init__(self, name=fun)
+        # Don't keep the process alive for a runner nobody waits on.
+        self.daemon = True
+        self._run = run
+        self.fun = fun
+        self.arg = arg
+        self.minions = minions
+        self.result = None
+        self.error = None
+        self.duration = None
+
+    def run(self):
+        start = time.time()
+        try:
+            self.result = self._run(self.fun, self.arg, self.minions)
+        except SyncDriverError as e:
+            self.error = e
+        except Exception as e:
+            # Anything else would only be printed by the thread, and the
+            # call would look like it succeeded.
+            msg = 'Call to {0} failed: {1}'.format(self.fun, e)
+            self.error = SyncDriverError(msg, 5)
+        finally:
+            self.duration = time.time() - start
+
 
 class SyncDriver(drivers.SyncDriver):
 
@@ -35,15 +253,49 @@ class SyncDriver(drivers.SyncDriver):
         self._deploy_dir = os.path.join(self.conf.repo.git_dir,
                                         'deploy')
         self._deploy_file = os.path.join(self._deploy_dir, 'deploy')
-        self._report_driver = conf.drivers['report-driver']
+        self._dispatched = None
+
+    @property
+    def _report_driver(self):
+        return self.conf.drivers['report-driver']
 
     def get_config(self):
-        return {
+        config = dict(transport.TRANSPORT_CONFIG)
+        config.update({
             'deploy.checkout-submodules': {
                 'required': False,
                 'default': False
+            },
+            'deploy.submodule-workers': {
+                'required': False,
+                'default': 8
+            },
+            'deploy.auto-fetch-threshold': {
+                'required': False,
+                'default': 100
+            },
+            'deploy.auto-checkout-threshold': {
+                'required': False,
+                'default': 100
+            },
+            'deploy.auto-stage-timeout': {
+                'required': False,
+                'default': 600
+            },
+            'deploy.fetch-concurrency': {
+                'required': False,
+                'default': None
+            },
+            'deploy.checkout-waves': {
+                'required': False,
+                'default': None
+            },
+            'deploy.checkout-wave-max-failures': {
+                'required': False,
+                'default': 0
             }
-        }
+        })
+        return config
 
     def _write_deploy_file(self, tag):
         timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
@@ -60,51 +312,399 @@ class SyncDriver(drivers.SyncDriver):
         except OSError:
             raise SyncDriverError('Failed to write deploy file', 1)
 
-    def _update_server_info(self, tag):
-        # TODO (ryan-lane): Use GitPython for this function if possible
-        # TODO (ryan-lane): Check return values from these commands
-        p = subprocess.Popen(['git','update-server-info'],
-                             cwd=self._deploy_dir,
+    def _list_gitlinks(self, path):
+        # Submodules are the gitlink (mode 160000) entries of the index.
+        # Unlike git submodule status, this doesn't run git describe for
+        # every submodule. Lines are '<mode> <sha1> <stage>\t<path>'.
+        p = subprocess.Popen(['git', 'ls-files', '--stage', '-z'],
+                             cwd=path,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        if p.returncode:
+            msg = 'Failed to list submodules in {0}: {1}'
+            raise SyncDriverError(msg.format(path, err.strip()), 4)
+        gitlinks = []
+        for entry in out.split('\0'):
+            if entry.startswith('160000 '):
+                gitlinks.append(entry.split('\t', 1)[1])
+        return gitlinks
+
+    def _get_submodules(self):
+        # Walk the submodule tree one repository at a time. Submodules that
+        # aren't initialized have no .git and nothing to update.
+        submodules = []
+        pending = [self.conf.repo.working_dir]
+        while pending:
+            parent = pending.pop(0)
+            for name in self._list_gitlinks(parent):
+                path = os.path.join(parent, name)
+                if not os.path.exists(os.path.join(path, '.git')):
+                    continue
+                submodules.append(path)
+                pending.append(path)
+        return submodules
+
+    def _run_update_server_info(self, git_dir):
+        # Returns an error message, or None.
+        returncode, err = submodule_update.update_server_info(git_dir)
+        if returncode:
+            return 'update-server-info failed: {0}'.format(err.strip())
+        return None
+
+    def _update_submodule(self, path, tag):
+        # The same tag used in the parent needs to exist in the submodule
+        p = subprocess.Popen(['git', 'tag', tag.name],
+                             cwd=path,
+                             stdout=subprocess.PIPE,
                              stderr=subprocess.PIPE)
-        p.communicate()
+        err = p.communicate()[1]
+        if p.returncode:
+            return 'tag failed: {0}'.format(err.strip())
+        try:
+            git_dir = submodule_update.get_git_dir(path)
+        except (IOError, OSError) as e:
+            return 'could not find git dir: {0}'.format(e)
+        return self._run_update_server_info(git_dir)
+
+    def _update_submodules(self, tag):
+        # Returns the number of submodules.
+        submodules = self._get_submodules()
+        if not submodules:
+            return 0
+        try:
+            workers = max(int(self.conf.config['deploy.submodule-workers']),
+                          1)
+        except (TypeError, ValueError):
+            msg = 'deploy.submodule-workers must be an integer'
+            raise SyncDriverError(msg, 1)
+        pool = ThreadPool(min(workers, len(submodules)))
+        try:
+            results = pool.map(lambda path: self._update_submodule(path, tag),
+                               submodules)
+        finally:
+            pool.close()
+            pool.join()
+        failed = [(path, error)
+                  for path, error in zip(submodules, results) if error]
+        if failed:
+            for path, error in failed:
+                LOG.error('{0}: {1}'.format(path, error))
+            msg = 'Failed to update {0} of {1} submodules'
+            raise SyncDriverError(msg.format(len(failed), len(submodules)), 4)
+        return len(submodules)
+
+    def _update_server_info(self, tag):
+        start = time.time()
+        error = self._run_update_server_info(self.conf.repo.git_dir)
+        if error:
+            raise SyncDriverError(error, 4)
+        repos = 1
         # Also update server info for all submodules
         if self.conf.config['deploy.checkout-submodules']:
-            # The same tag used in the parent needs to exist in the submodule
-            p = subprocess.Popen(['git','submodule','foreach','--recursive',
-                                  'git','tag',tag.name],
-                                 cwd=self.conf.repo.working_dir,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            p.communicate()
-            p = subprocess.Popen(['git','submodule','foreach','--recursive',
-                                  'trigger-submodule-update'],
-                                 cwd=self.conf.repo.working_dir,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
-            p.communicate()
-
-    def _fetch(self, args):
-        # TODO (ryan-lane): Check return values from these commands
+            repos += self._update_submodules(tag)
+        msg = 'Updated server info for {0} repositories in {1:.2f}s'
+        LOG.info(msg.format(repos, time.time() - start))
+
+    def _run(self, fun, arg, minions=None):
+        try:
+            runner_transport = transport.get_transport(self.conf)
+            if minions is None:
+                ret = runner_transport.run(fun, arg)
+            else:
+                ret = runner_transport.publish(minions, fun, arg)
+        except transport.TransportError as e:
+            raise SyncDriverError(e.message, 5)
+        if isinstance(ret, basestring):
+            msg = 'Error received from salt; raw output:\n\n{0}'
+            raise SyncDriverError(msg.format(ret), 5)
+        return ret
+
+    def _wait_for_dispatch(self):
+        # Runner calls are made one at a time; wait for the previous call
+        # to return and raise its error, if any.
+        call = self._dispatched
+        if call is None:
+            return
+        if call.is_alive():
+            LOG.info('Waiting for {0} to return'.format(call.fun))
+            # Join with a timeout, so that Ctrl-C is still delivered.
+            while call.is_alive():
+                call.join(POLL_MIN_INTERVAL)
+        self._dispatched = None
+        if call.minions is None:
+            # How long the runner took to return, as opposed to how long
+            # the minions took to complete the stage.
+            metrics.get_timings().record(
+                '{0}_runner'.format(call.fun.split('.')[-1]), call.duration)
+        if call.error is not None:
+            raise call.error
+
+    def _dispatch_failed(self):
+        # Returns the error of a finished runner call, without waiting for
+        # a call that is still running.
+        call = self._dispatched
+        if call is None or call.is_alive() or call.error is None:
+            return None
+        self._dispatched = None
+        return call.error
+
+    def _dispatch(self, fun, arg, minions=None):
+        self._wait_for_dispatch()
+        self._dispatched = RunnerCall(self._run, fun, arg, minions)
+        self._dispatched.start()
+
+    def _get_fetch_concurrency(self, concurrency, total):
+        concurrency = str(concurrency).strip()
+        try:
+            if concurrency.endswith('%'):
+                size = int(math.ceil(total * float(concurrency[:-1]) / 100))
+            else:
+                size = int(concurrency)
+        except ValueError:
+            msg = ('deploy.fetch-concurrency must be a number of minions or'
+                   ' a percentage')
+            raise SyncDriverError(msg, 1)
+        return max(size, 1)
+
+    def _fetch_windowed(self, args, tag, size, minions):
+        # Keep at most size minions fetching at once, dispatching more as
+        # minions report the fetched tag, so the deployment server serves a
+        # steady number of fetches.
+        repo_name = self.conf.config['deploy.repo-name']
+        timeout = self._get_auto_setting(args, 'stage_timeout',
+                                         'deploy.auto-stage-timeout')
+        started = time.time()
+        statuses = self._report_driver.get_stage_status(tag, 'fetch',
+                                                        minions)
+        queue = [minion for minion in minions
+                 if not statuses[minion]['complete']]
+        total = len(queue)
+        # Minion name to the time it was dispatched
+        in_flight = {}
+        # publish.publish waits on minion returns, so window refills are
+        # sent without waiting on earlier publishes; completion is tracked
+        # through redis instead.
+        calls = []
+        done = 0
+        interval = POLL_MIN_INTERVAL
+        self._wait_for_dispatch()
+        while queue:
+            for call in [call for call in calls if not call.is_alive()]:
+                calls.remove(call)
+                if call.error is not None:
+                    raise call.error
+            if in_flight:
+                statuses = self._report_driver.get_stage_status(
+                    tag, 'fetch', sorted(in_flight))
+                now = time.time()
+                for minion, status in statuses.items():
+                    if (status['complete'] or
+                            self._stage_failed(status, started)):
+                        del in_flight[minion]
+                        done += 1
+                    elif now - in_flight[minion] > timeout:
+                        LOG.warning('{0} did not report its fetch within {1:g}'
+                                    ' seconds'.format(minion, timeout))
+                        del in_flight[minion]
+                        done += 1
+            free = size - len(in_flight)
+            if free > 0:
+                batch = queue[:free]
+                del queue[:free]
+                call = RunnerCall(self._run, 'deploy.fetch', repo_name, batch)
+                call.start()
+                calls.append(call)
+                now = time.time()
+                for minion in batch:
+                    in_flight[minion] = now
+                msg = ('Fetch: {0}/{1} minions done, {2} fetching, {3}'
+                       ' queued')
+                LOG.info(msg.format(done, total, len(in_flight), len(queue)))
+                interval = POLL_MIN_INTERVAL
+            else:
+                interval = min(interval * 2, POLL_MAX_INTERVAL)
+                time.sleep(interval)
+        # Wait for the outstanding publishes like for any other dispatch.
+        self._dispatched = RunnerCall(
+            lambda fun, arg, minions: self._join_calls(calls),
+            'deploy.fetch', repo_name, [])
+        self._dispatched.start()
+
+    def _join_calls(self, calls):
+        for call in calls:
+            call.join()
+            if call.error is not None:
+                raise call.error
+
+    def _fetch(self, args, tag):
         repo_name = self.conf.config['deploy.repo-name']
-        p = subprocess.Popen(['sudo','salt-call','-l','quiet','publish.runner',
-                              'deploy.fetch', repo_name],
-                             stdout=subprocess.PIPE)
-        p.communicate()
+        concurrency = getattr(args, 'fetch_concurrency', None)
+        if concurrency is None:
+            concurrency = self.conf.config['deploy.fetch-concurrency']
+        if concurrency:
+            minions = self._report_driver.get_minions()
+            size = self._get_fetch_concurrency(concurrency, len(minions))
+            if size < len(minions):
+                self._fetch_windowed(args, tag, size, minions)
+                return
+        self._dispatch('deploy.fetch', repo_name)
 
     def _checkout(self, args):
-        # TODO (ryan-lane): Check return values from these commands
         repo_name = self.conf.config['deploy.repo-name']
-        p = subprocess.Popen(['sudo','salt-call','-l','quiet','publish.runner',
-                              'deploy.checkout', repo_name+','+str(args.force)],
-                             stdout=subprocess.PIPE)
-        p.communicate()
+        self._dispatch('deploy.checkout', repo_name+','+str(args.force))
+
+    def _get_waves(self, waves, total):
+        # Returns the cumulative number of minions checked out by each wave
+        # before the final, full fleet wave.
+        sizes = []
+        for wave in str(waves).split(','):
+            wave = wave.strip()
+            try:
+                if wave.endswith('%'):
+                    size = int(math.ceil(total * float(wave[:-1]) / 100))
+                else:
+                    size = int(wave)
+            except ValueError:
+                msg = ('deploy.checkout-waves must be a comma separated list'
+                       ' of minion counts or percentages')
+                raise SyncDriverError(msg, 1)
+            size = max(size, 1)
+            # Skip waves that wouldn't add any minions.
+            if size >= total or (sizes and size <= sizes[-1]):
+                continue
+            sizes.append(size)
+        return sizes
+
+    def _stage_failed(self, status, started):
+        # A failure only counts if it was reported after started.
+        return (status['status'] is not None and
+                str(status['status']) != '0' and
+                status['timestamp'] is not None and
+                status['timestamp'] >= started)
+
+    def _gate_wave(self, args, tag, wave, waves, minions, started):
+        threshold = self._get_auto_setting(args, 'checkout_threshold',
+                                           'deploy.auto-checkout-threshold')
+        timeout = self._get_auto_setting(args, 'stage_timeout',
+                                         'deploy.auto-stage-timeout')
+        max_failures = self._get_auto_setting(
+            args, 'wave_max_failures', 'deploy.checkout-wave-max-failures')
+        deadline = time.time() + timeout
+        interval = POLL_MIN_INTERVAL
+        last = None
+        while True:
+            error = self._dispatch_failed()
+            if error is not None:
+                raise error
+            statuses = self._report_driver.get_stage_status(tag, 'checkout',
+                                                            minions)
+            failed = sorted(minion for minion, status in statuses.items()
+                            if self._stage_failed(status, started))
+            complete = [minion for minion, status in statuses.items()
+                        if status['complete'] and minion not in failed]
+            if len(failed) > max_failures:
+                msg = ('Stopped the checkout at wave {0}/{1}, minions failed'
+                       ' the checkout: {2}. The remaining minions have not'
+                       ' been checked out; please fix the failures and sync'
+                       ' again, or revert.')
+                raise SyncDriverError(msg.format(wave, waves,
+                                                 ', '.join(failed)), 3)
+            # Tolerated failures don't count against the threshold.
+            healthy = len(minions) - len(failed)
+            if healthy:
+                percent = 100.0 * len(complete) / healthy
+            else:
+                percent = 100.0
+            if (len(complete), len(failed)) != last:
+                msg = ('Wave {0}/{1}: {2}/{3} minions completed checkout'
+                       ' ({4:.1f}%, {5} failed, waiting for {6:g}%)')
+                LOG.info(msg.format(wave, waves, len(complete), healthy,
+                                    percent, len(failed), threshold))
+                last = (len(complete), len(failed))
+                interval = POLL_MIN_INTERVAL
+            else:
+                interval = min(interval * 2, POLL_MAX_INTERVAL)
+            if percent >= threshold:
+                return
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                pending = sorted(set(minions) - set(complete) - set(failed))
+                msg = ('Stopped the checkout at wave {0}/{1}, {2}/{3} minions'
+                       ' completed the checkout in time.').format(
+                    wave, waves, len(complete), healthy)
+                if pending:
+                    msg += ' Pending minions include: {0}.'.format(
+                        ', '.join(pending[:20]))
+                msg += (' The remaining minions have not been checked out;'
+                        ' please sync again, or revert.')
+                raise SyncDriverError(msg, 3)
+            time.sleep(min(interval, remaining))
+
+    def _checkout_waves(self, args, tag):
+        # Check out to growing slices of the fleet, gating each wave on its
+        # minions completing the checkout, before checking out everywhere.
+        waves = getattr(args, 'waves', None)
+        if waves is None:
+            waves = self.conf.config['deploy.checkout-waves']
+        if not waves:
+            return
+        minions = self._report_driver.get_minions()
+        sizes = self._get_waves(waves, len(minions))
+        if not sizes:
+            return
+        repo_name = self.conf.config['deploy.repo-name']
+        waves = len(sizes) + 1
+        started = time.time()
+        done = 0
+        for wave, size in enumerate(sizes, 1):
+            LOG.info('Checkout wave {0}/{1}: {2} minions'.format(
+                wave, waves, size - done))
+            self._dispatch('deploy.checkout', repo_name+','+str(args.force),
+                           minions[done:size])
+            # Earlier waves are gated again, so a minion that failed after
+            # completing also stops the rollout.
+            self._gate_wave(args, tag, wave, waves, minions[:size], started)
+            done = size
+        metrics.get_timings().record('checkout_waves', time.time() - started)
+        LOG.info('Checkout wave {0}/{0}: all minions'.format(waves))
+
+    def _retry(self, stage, args, tag):
+        try:
+            if stage == "fetch":
+                self._fetch(args, tag)
+            if stage == "checkout":
+                self._checkout(args)
+        except SyncDriverError as e:
+            # Let the user decide what to do next.
+            LOG.error(e.message)
+            return
+        self._watch_dispatch(stage, tag)
+
+    def _watch_dispatch(self, stage, tag):
+        # Stream progress while the runner call is in flight. The watch
+        # ends when every minion has completed, so the user can decide
+        # to continue before the runner returns.
+        call = self._dispatched
+        if call is not None and call.is_alive():
+            try:
+                self._report_driver.watch_sync(
+                    tag, report_type=stage, until=lambda: not call.is_alive())
+            except NotImplementedError:
+                # Report drivers without watch support get the plain
+                # report and prompt.
+                LOG.debug('The report driver can not watch progress')
+        error = self._dispatch_failed()
+        if error is not None:
+            LOG.error(error.message)
 
     def _ask(self, stage, args, tag):
+        self._watch_dispatch(stage, tag)
         self._report_driver.report_sync(tag,
                                         report_type=stage)
         while True:
             answer = raw_input("Continue? ([d]etailed/[C]oncise report,"
-                               "[y]es,[n]o,[r]etry): ")
+                               "[w]atch,[y]es,[n]o,[r]etry): ")
             if not answer or answer == "c" or answer == "C":
                 self._report_driver.report_sync(tag,
                                                 report_type=stage)
@@ -112,33 +712,109 @@ class SyncDriver(drivers.SyncDriver):
                 self._report_driver.report_sync(tag,
                                                 report_type=stage,
                                                 detailed=True)
+            elif answer == "w" or answer == "W":
+                try:
+                    self._report_driver.watch_sync(tag, report_type=stage)
+                except NotImplementedError:
+                    LOG.info('The report driver can not watch progress.')
+                    self._report_driver.report_sync(tag,
+                                                    report_type=stage)
             elif answer == "Y" or answer == "y":
                 return True
             elif answer == "N" or answer == "n":
                 return False
             elif answer == "R" or answer == "r":
-                if stage == "fetch":
-                    self._fetch(args)
-                if stage == "checkout":
-                    self._checkout(args)
+                self._retry(stage, args, tag)
+
+    def _get_auto_setting(self, args, attr, key):
+        value = getattr(args, attr, None)
+        if value is None:
+            value = self.conf.config[key]
+        try:
+            return float(str(value).rstrip('%'))
+        except ValueError:
+            msg = '{0} must be a number'.format(key)
+            raise SyncDriverError(msg, 1)
+
+    def _wait(self, stage, args, tag):
+        threshold = self._get_auto_setting(args, stage + '_threshold',
+                                           'deploy.auto-{0}-threshold'
+                                           .format(stage))
+        timeout = self._get_auto_setting(args, 'stage_timeout',
+                                         'deploy.auto-stage-timeout')
+        deadline = time.time() + timeout
+        interval = POLL_MIN_INTERVAL
+        last = None
+        while True:
+            error = self._dispatch_failed()
+            if error is not None:
+                raise error
+            progress = self._report_driver.get_sync_progress(tag, stage)
+            complete = progress['complete']
+            total = progress['total']
+            if total:
+                percent = 100.0 * complete / total
+            else:
+                percent = 0.0
+            if (complete, total) != last:
+                msg = ('{0}/{1} minions completed {2} ({3:.1f}%, waiting for'
+                       ' {4:g}%)')
+                LOG.info(msg.format(complete, total, stage, percent,
+                                    threshold))
+                last = (complete, total)
+                interval = POLL_MIN_INTERVAL
+            else:
+                interval = min(interval * 2, POLL_MAX_INTERVAL)
+            if total and percent >= threshold:
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                progress = self._report_driver.get_sync_progress(
+                    tag, stage, pending_limit=20)
+                if progress['pending_minions']:
+                    LOG.error('Pending minions include: {0}'.format(
+                        ', '.join(progress['pending_minions'])))
+                return False
+            time.sleep(min(interval, remaining))
+
+    def _continue(self, stage, args, tag):
+        if getattr(args, 'auto', False):
+            return self._wait(stage, args, tag)
+        return self._ask(stage, args, tag)
 
     def sync(self, tag, args):
         # TODO (ryan-lane): Break sync up into two stages and move this
         #                   logic out of the driver
-        self._write_deploy_file(tag)
-        self._update_server_info(tag)
-        self._fetch(args)
+        timings = metrics.get_timings()
+        with timings.phase('deploy_file_write'):
+            self._write_deploy_file(tag)
+        with timings.phase('update_server_info'):
+            self._update_server_info(tag)
+        # Runner calls are dispatched in the background, and progress is
+        # reported while they run.
+        start = time.time()
+        with timings.phase('fetch_dispatch'):
+            self._fetch(args, tag.name)
         # TODO (ryan-lane): Add repo dependencies here
-        if not self._ask('fetch', args, tag.name):
+        if not self._continue('fetch', args, tag.name):
+            self._wait_for_dispatch()
             msg = ('Not continuing to checkout phase. A deployment is still'
                    ' underway, please finish, sync, or abort.')
             raise SyncDriverError(msg, 2)
-        self._checkout(args)
-        if not self._ask('checkout', args, tag.name):
+        # With --auto, the time for the threshold of minions to fetch.
+        timings.record('fetch', time.time() - start)
+        start = time.time()
+        self._checkout_waves(args, tag.name)
+        with timings.phase('checkout_dispatch'):
+            self._checkout(args)
+        if not self._continue('checkout', args, tag.name):
+            self._wait_for_dispatch()
             msg = ('Not continuing to finish phase. A checkout has already'
                    ' occurred. Please finish, sync or revert. Aborting'
                    ' at this phase is not recommended.')
             raise SyncDriverError(msg, 3)
+        timings.record('checkout', time.time() - start)
+        self._wait_for_dispatch()
 
     def get_deploy_info(self):
         try:
@@ -146,12 +822,14 @@ class SyncDriver(drivers.SyncDriver):
             deploy_info = json.loads(f.read())
             f.close()
             return deploy_info
-        except OSError:
+        except (IOError, OSError, ValueError):
             raise SyncDriverError('Failed to load deploy file', 3)
 
 
 class LockDriver(drivers.LockDriver):
 
+    heartbeat_interval = 30
+
     def __init__(self, conf):
         self.conf = conf
         self._deploy_dir = os.path.join(self.conf.repo.git_dir,
@@ -167,19 +845,144 @@ class LockDriver(drivers.LockDriver):
         except OSError:
             raise LockDriverError('Failed to create deploy directory', 1)
 
-    def add_lock(self, args):
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        lock_info = {
-            'time': timestamp,
+    def get_config(self):
+        return {
+            'deploy.lock-stale-timeout': {
+                'required': False,
+                'default': 300
+            }
+        }
+
+    def _new_lock_info(self):
+        return {
+            'time': datetime.now().strftime('%Y%m%d-%H%M%S'),
             'user': self.conf.config['user.name'],
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'heartbeat': time.time(),
+            # Whether a process is working under the lock right now, as
+            # opposed to the lock being held between commands.
+            'active': False,
         }
+
+    def _create_lock(self, lock_info):
+        # O_EXCL makes creating the lock file atomic, so only one deployer
+        # can acquire the lock.
+        fd = os.open(self._lock_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                     0o644)
         try:
-            f = open(self._lock_file, 'w+')
-            f.write(json.dumps(lock_info))
-            f.close()
-        except (OSError, IOError):
+            os.write(fd, json.dumps(lock_info))
+        finally:
+            os.close(fd)
+
+    def _replace_lock(self, lock_info):
+        tmp_file = '{0}.{1}'.format(self._lock_file, os.getpid())
+        f = open(tmp_file, 'w')
+        f.write(json.dumps(lock_info))
+        f.close()
+        os.rename(tmp_file, self._lock_file)
+
+    def _pid_exists(self, pid):
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno != errno.ESRCH
+        return True
+
+    def _is_stale(self, lock_info):
+        # Only locks held by a process that is working under them (sync)
+        # can go stale; a lock held between commands never does.
+        if not lock_info.get('active'):
+            return False
+        pid = lock_info.get('pid')
+        if lock_info.get('host') == socket.gethostname() and pid:
+            # A live process may just be suspended or stalled, and would
+            # carry on under a replaced lock, so on this host only the pid
+            # decides.
+            return not self._pid_exists(pid)
+        try:
+            timeout = float(self.conf.config['deploy.lock-stale-timeout'])
+        except (TypeError, ValueError):
+            msg = 'deploy.lock-stale-timeout must be a number'
+            raise LockDriverError(msg, 1)
+        heartbeat = lock_info.get('heartbeat') or 0
+        return time.time() - heartbeat > timeout
+
+    def _locked_error(self, lock_info):
+        if lock_info.get('user'):
+            msg = ('A deployment has already been started for this repo by'
+                   ' {0}.').format(lock_info['user'])
+        else:
+            msg = 'A deployment has already been started for this repo.'
+        return LockDriverError(msg, 2)
+
+    def _break_stale_lock(self, lock_info):
+        # Serialize stale lock removal between deployers, so a deployer
+        # can't remove a lock that another just acquired. The deploy
+        # directory itself is flocked, which leaves no guard file behind.
+        guard = os.open(self._deploy_dir, os.O_RDONLY)
+        try:
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            current = self.check_lock(None)
+            if current and not self._is_stale(current):
+                raise self._locked_error(current)
+            if current:
+                msg = ('Removing stale lock held by {0} (pid {1} on {2}, last'
+                       ' heartbeat at {3}).')
+                heartbeat = current.get('heartbeat')
+                if heartbeat:
+                    heartbeat = datetime.fromtimestamp(heartbeat)
+                LOG.warning(msg.format(current.get('user'),
+                                       current.get('pid'),
+                                       current.get('host'),
+                                       heartbeat))
+                os.remove(self._lock_file)
+            self._create_lock(lock_info)
+        finally:
+            os.close(guard)
+
+    def add_lock(self, args):
+        lock_info = self._new_lock_info()
+        try:
+            self._create_lock(lock_info)
+            return
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise LockDriverError('Failed to write lock file', 1)
+        try:
+            self._break_stale_lock(lock_info)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                raise self._locked_error(self.check_lock(args))
+            raise LockDriverError('Failed to write lock file', 1)
+        except IOError:
             raise LockDriverError('Failed to write lock file', 1)
 
+    def refresh_lock(self, args):
+        lock_info = self.check_lock(args)
+        if not lock_info:
+            return
+        lock_info.update({
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'heartbeat': time.time(),
+            'active': True,
+        })
+        try:
+            self._replace_lock(lock_info)
+        except (OSError, IOError):
+            raise LockDriverError('Failed to update lock file', 4)
+
+    def detach_lock(self, args):
+        lock_info = self.check_lock(args)
+        if not lock_info:
+            return
+        lock_info['active'] = False
+        try:
+            self._replace_lock(lock_info)
+        except (OSError, IOError):
+            raise LockDriverError('Failed to update lock file', 4)
+
     def remove_lock(self, args):
         try:
             os.remove(self._lock_file)
@@ -199,52 +1002,316 @@ class LockDriver(drivers.LockDriver):
             return {'user': None, 'time': None}
 
 
+class RedisLockDriver(drivers.LockDriver):
+    """
+    Lock driver keeping the deployment lock in redis as a lease, so that
+    deployments are serialized across deployment hosts. The lease is renewed
+    in the background while a sync runs.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self._deploy_dir = os.path.join(self.conf.repo.git_dir,
+                                        'deploy')
+        self._token_file = os.path.join(self._deploy_dir, 'lock-token')
+        self._redis_pool = None
+        self._release_script = None
+        self._renew_script = None
+
+    def get_config(self):
+        config = dict(REDIS_CONFIG)
+        config.update({
+            'deploy.lock-lease-ttl': {
+                'required': False,
+                'default': 3600
+            }
+        })
+        return config
+
+    @property
+    def heartbeat_interval(self):
+        return max(self._get_ttl() / 3.0, 1)
+
+    def _get_ttl(self):
+        try:
+            return float(self.conf.config['deploy.lock-lease-ttl'])
+        except (TypeError, ValueError):
+            msg = 'deploy.lock-lease-ttl must be a number'
+            raise LockDriverError(msg, 1)
+
+    def _get_redis_serv(self):
+        if self._redis_pool is None:
+            try:
+                self._redis_pool = get_redis_pool(self.conf)
+            except ValueError as e:
+                raise LockDriverError(str(e), 1)
+        return redis.Redis(connection_pool=self._redis_pool)
+
+    def _get_lock_key(self):
+        return 'deploy:{0}:lock'.format(self.conf.config['deploy.repo-name'])
+
+    def _get_lock_value(self, serv):
+        try:
+            return serv.get(self._get_lock_key())
+        except redis.RedisError as e:
+            raise LockDriverError('Failed to read lock: {0}'.format(e), 1)
+
+    def _write_token(self, token):
+        # The token is kept on disk, so that later commands (sync, finish)
+        # run from this repo can prove they own the lease.
+        try:
+            if not os.path.isdir(self._deploy_dir):
+                os.mkdir(self._deploy_dir)
+            tmp_file = '{0}.{1}'.format(self._token_file, os.getpid())
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                         0o600)
+            try:
+                os.write(fd, token)
+            finally:
+                os.close(fd)
+            os.rename(tmp_file, self._token_file)
+        except (IOError, OSError) as e:
+            raise LockDriverError('Failed to write lock token: {0}'.format(e),
+                                  1)
+
+    def _read_token(self):
+        try:
+            f = open(self._token_file, 'r')
+            token = f.read().strip()
+            f.close()
+        except (IOError, OSError):
+            return None
+        return token or None
+
+    def _remove_token(self):
+        try:
+            os.remove(self._token_file)
+        except OSError:
+            pass
+
+    def _not_owner_error(self, action, errorno):
+        msg = ('Failed to {0} lock: the lock is held by another deployment'
+               ' or was not acquired from this repository').format(action)
+        return LockDriverError(msg, errorno)
+
+    def add_lock(self, args):
+        serv = self._get_redis_serv()
+        token = binascii.hexlify(os.urandom(16))
+        lock_info = {
+            'time': datetime.now().strftime('%Y%m%d-%H%M%S'),
+            'user': self.conf.config['user.name'],
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'heartbeat': time.time(),
+            'token': token,
+        }
+        try:
+            acquired = serv.set(self._get_lock_key(), json.dumps(lock_info),
+                                nx=True, px=int(self._get_ttl() * 1000))
+        except redis.RedisError as e:
+            raise LockDriverError('Failed to write lock: {0}'.format(e), 1)
+        if not acquired:
+            lock_info = self.check_lock(args)
+            if lock_info.get('user'):
+                msg = ('A deployment has already been started for this repo'
+                       ' by {0}.').format(lock_info['user'])
+            else:
+                msg = 'A deployment has already been started for this repo.'
+            raise LockDriverError(msg, 2)
+        self._write_token(token)
+
+    def remove_lock(self, args):
+        serv = self._get_redis_serv()
+        token = self._read_token()
+        if token is None:
+            raise self._not_owner_error('remove', 3)
+        if self._release_script is None:
+            self._release_script = serv.register_script(RELEASE_LOCK_SCRIPT)
+        try:
+            removed = self._release_script(keys=[self._get_lock_key()],
+                                           args=[token], client=serv)
+        except redis.RedisError as e:
+            raise LockDriverError('Failed to remove lock: {0}'.format(e), 3)
+        if removed == 0:
+            self._remove_token()
+            raise LockDriverError('Failed to remove lock: no lock is held', 3)
+        if removed < 0:
+            raise self._not_owner_error('remove', 3)
+        self._remove_token()
+
+    def check_lock(self, args):
+        value = self._get_lock_value(self._get_redis_serv())
+        if value is None:
+            return {}
+        try:
+            return json.loads(value)
+        except ValueError:
+            return {'user': None, 'time': None}
+
+    def refresh_lock(self, args):
+        serv = self._get_redis_serv()
+        value = self._get_lock_value(serv)
+        if value is None:
+            # The lease expired or was removed; another deployer may take
+            # the lock, so don't carry on silently.
+            raise LockDriverError('Lost the deployment lease', 4)
+        token = self._read_token()
+        if token is None:
+            raise self._not_owner_error('renew', 4)
+        try:
+            lock_info = json.loads(value)
+        except ValueError:
+            lock_info = {}
+        lock_info.update({
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'heartbeat': time.time(),
+            'token': token,
+        })
+        if self._renew_script is None:
+            self._renew_script = serv.register_script(RENEW_LOCK_SCRIPT)
+        try:
+            renewed = self._renew_script(keys=[self._get_lock_key()],
+                                         args=[token, json.dumps(lock_info),
+                                               int(self._get_ttl() * 1000)],
+                                         client=serv)
+        except redis.RedisError as e:
+            raise LockDriverError('Failed to renew lock: {0}'.format(e), 4)
+        if renewed == 0:
+            raise LockDriverError('Lost the deployment lease', 4)
+        if renewed < 0:
+            raise self._not_owner_error('renew', 4)
+
+
 class ServiceDriver(drivers.ServiceDriver):
 
     def __init__(self, conf):
         self.conf = conf
+        self._deploy_dir = os.path.join(self.conf.repo.git_dir,
+                                        'deploy')
+        self._restart_file = os.path.join(self._deploy_dir, 'restart')
+
+    def get_config(self):
+        return dict(transport.TRANSPORT_CONFIG)
+
+    def _write_restart_file(self, args):
+        restart_info = {
+            'time': time.time(),
+            'user': self.conf.config['user.name'],
+            'batch': args.batch,
+        }
+        try:
+            if not os.path.isdir(self._deploy_dir):
+                os.mkdir(self._deploy_dir)
+            f = open(self._restart_file, 'w+')
+            f.write(json.dumps(restart_info))
+            f.close()
+        except (IOError, OSError):
+            # Only restart reports depend on this, so don't stop the restart.
+            LOG.warning('Failed to write restart file')
+
+    def get_restart_info(self):
+        try:
+            f = open(self._restart_file, 'r')
+            restart_info = json.loads(f.read())
+            f.close()
+            return restart_info
+        except (IOError, OSError, ValueError):
+            raise ServiceDriverError('Failed to load restart file', 3)
 
     def restart(self, args):
         repo_name = self.conf.config['deploy.repo-name']
-        p = subprocess.Popen(['sudo','salt-call','-l','quiet','--out=json',
-                              'publish.runner','deploy.restart',
-                              repo_name+','+str(args.batch)],
-                             stdout=subprocess.PIPE)
-        out = p.communicate()[0]
+        self._write_restart_file(args)
         ## Disabled until salt bug is fixed:
         ##   https://github.com/saltstack/salt/issues/9146
         #LOG.info('Service restart sent to salt. Check the status using:'
         #         ' deploy-info --repo={0} --restart'.format(repo))
         ## Display the data directly from the runner return until bug is fixed.
+        ## Batches are logged as they are parsed, and only the counts and
+        ## failed minions are kept for the summary.
+        counts = {}
+        failed = []
         try:
-            minion_data = json.loads(out)
-        except (ValueError, AttributeError):
-            msg = 'Could not parse salt return; raw output:\n\n{0}'
-            raise ServiceDriverError(msg.format(out), 1)
-        minion_data = minion_data['local']
-        if isinstance(minion_data, basestring):
-            msg = 'Error received from salt; raw output:\n\n{0}'
-            raise ServiceDriverError(msg.format(minion_data), 2)
-        for i in minion_data:
-            try:
-                for minion, data in i.items():
+            batches = transport.get_transport(self.conf).stream(
+                'deploy.restart', repo_name+','+str(args.batch))
+            for i in batches:
+                try:
+                    items = i.items()
+                except AttributeError:
+                    LOG.error('Got bad return from salt. Here is the raw'
+                              ' data:')
+                    LOG.error('{}'.format(i))
+                    continue
+                for minion, data in items:
                     try:
-                        LOG.info('{0}: {1}'.format(minion, data['status']))
-                    except KeyError:
+                        status = data['status']
+                    except (KeyError, TypeError):
+                        status = None
+                    if status is None:
                         LOG.info('{0}: No status available'.format(minion))
-            except AttributeError:
-                LOG.error('Got bad return from salt. Here is the raw data:')
-                LOG.error('{}'.format(i))
+                        status = 'unknown'
+                    else:
+                        LOG.info('{0}: {1}'.format(minion, status))
+                        if str(status) != '0':
+                            failed.append(minion)
+                    counts[str(status)] = counts.get(str(status), 0) + 1
+        except transport.TransportError as e:
+            raise ServiceDriverError(e.message, e.errorno)
+        self._log_restart_summary(counts, failed)
+
+    def _log_restart_summary(self, counts, failed):
+        LOG.info('')
+        total = sum(counts.values())
+        statuses = ', '.join('{0}: {1}'.format(status, count)
+                             for status, count in sorted(counts.items()))
+        LOG.info('{0} minions returned ({1})'.format(total, statuses or
+                                                     'no returns'))
+        if failed:
+            LOG.error('Failed minions: {0}'.format(', '.join(sorted(failed))))
 
 
 class ReportDriver(drivers.ReportDriver):
 
     def __init__(self, conf):
         self.conf = conf
+        # The pool lives as long as the driver, so repeated reports during
+        # a sync reuse already established connections.
+        self._redis_pool = None
+        self._aggregate_script = None
+
+    def get_config(self):
+        config = dict(REDIS_CONFIG)
+        config.update({
+            'deploy.report-batch-size': {
+                'required': False,
+                'default': 500
+            },
+            'deploy.report-aggregation': {
+                'required': False,
+                'default': 'server'
+            },
+            'deploy.report-watch-channel': {
+                'required': False,
+                'default': None
+            }
+        })
+        return config
 
     def _get_redis_serv(self):
-        # TODO (ryan-lane): Load this info from config
-        return redis.Redis(host='localhost', port=6379, db=0)
+        if self._redis_pool is None:
+            try:
+                self._redis_pool = get_redis_pool(self.conf)
+            except ValueError as e:
+                raise ReportDriverError(str(e), 1)
+        return redis.Redis(connection_pool=self._redis_pool)
+
+    def _get_batch_size(self):
+        try:
+            batch_size = int(self.conf.config['deploy.report-batch-size'])
+        except (TypeError, ValueError):
+            msg = 'deploy.report-batch-size must be an integer'
+            raise ReportDriverError(msg, 1)
+        return max(batch_size, 1)
 
     def _mins_ago(self, now, timestamp):
         if timestamp:
@@ -255,111 +1322,747 @@ class ReportDriver(drivers.ReportDriver):
             mins = None
         return mins
 
-    def _get_minion_data(self, serv, repo, minion):
-        # TODO (ryan-lane): use hgetall, this is absurd
+    def _seconds_ago(self, now, timestamp):
+        if timestamp:
+            time = datetime.fromtimestamp(float(timestamp))
+            return (now - time).total_seconds()
+        return None
+
+    def _duration(self, start_timestamp, end_timestamp):
+        if start_timestamp and end_timestamp:
+            duration = float(end_timestamp) - float(start_timestamp)
+            if duration >= 0:
+                return duration
+        return None
+
+    def _timestamp(self, timestamp):
+        try:
+            return float(timestamp)
+        except (TypeError, ValueError):
+            return None
+
+    def _get_minion_data(self, now, minion_hash):
         data = {}
-        now = datetime.now()
-        minion_key = 'deploy:{0}:minions:{1}'.format(repo, minion)
-        data['fetch_status'] = serv.hget(minion_key, 'fetch_status')
-        fetch_checkin_timestamp = serv.hget(minion_key,
-                                            'fetch_checkin_timestamp')
-        data['fetch_checkin_mins'] = self._mins_ago(now,
-                                                    fetch_checkin_timestamp)
-        fetch_timestamp = serv.hget(minion_key, 'fetch_timestamp')
-        data['fetch_mins'] = self._mins_ago(now, fetch_timestamp)
-        data['checkout_status'] = serv.hget(minion_key, 'checkout_status')
-        checkout_checkin_timestamp = serv.hget(minion_key,
-                                               'checkout_checkin_timestamp')
-        _c_checkin_t = self._mins_ago(now, checkout_checkin_timestamp)
-        data['checkout_checkin_mins'] = _c_checkin_t
-        checkout_timestamp = serv.hget(minion_key, 'checkout_timestamp')
-        data['checkout_mins'] = self._mins_ago(now, checkout_timestamp)
-        data['tag'] = serv.hget(minion_key, 'tag')
-        data['fetch_tag'] = serv.hget(minion_key, 'fetch_tag')
-        restart_checkin_timestamp = serv.hget(minion_key,
-                                              'restart_checkin_timestamp')
-        _r_c_t = self._mins_ago(now, restart_checkin_timestamp)
-        data['restart_checkin_mins'] = _r_c_t
-        data['restart_status'] = serv.hget(minion_key, 'restart_status')
-        restart_timestamp = serv.hget(minion_key, 'restart_timestamp')
-        data['restart_mins'] = self._mins_ago(now, restart_timestamp)
+        for stage in ['fetch', 'checkout', 'restart']:
+            data[stage + '_status'] = minion_hash.get(stage + '_status')
+            checkin_timestamp = minion_hash.get(stage + '_checkin_timestamp')
+            data[stage + '_checkin_mins'] = self._mins_ago(now,
+                                                           checkin_timestamp)
+            timestamp = minion_hash.get(stage + '_timestamp')
+            data[stage + '_mins'] = self._mins_ago(now, timestamp)
+            # In seconds, for machine readable reports
+            data[stage + '_checkin_age'] = self._seconds_ago(
+                now, checkin_timestamp)
+            data[stage + '_duration'] = self._duration(checkin_timestamp,
+                                                       timestamp)
+            data[stage + '_checkin_time'] = self._timestamp(checkin_timestamp)
+            data[stage + '_time'] = self._timestamp(timestamp)
+        data['tag'] = minion_hash.get('tag')
+        data['fetch_tag'] = minion_hash.get('fetch_tag')
         return data
 
-    def report_sync(self, tag, report_type='full', detailed=False):
+    def _get_minions_data(self, serv, repo, minions):
+        # Read every minion hash once, with pipelined HGETALLs sent in
+        # batches, so a report costs one round trip per batch rather than
+        # a dozen per minion.
+        ret = {}
+        now = datetime.now()
+        minions = list(minions)
+        batch_size = self._get_batch_size()
+        for i in range(0, len(minions), batch_size):
+            batch = minions[i:i + batch_size]
+            pipe = serv.pipeline(transaction=False)
+            for minion in batch:
+                pipe.hgetall('deploy:{0}:minions:{1}'.format(repo, minion))
+            for minion, minion_hash in zip(batch, pipe.execute()):
+                ret[minion] = self._get_minion_data(now, minion_hash)
+        return ret
+
+    def _get_aggregate_counts(self, serv, repo_name, tag, stage,
+                              pending_limit):
+        if self._aggregate_script is None:
+            self._aggregate_script = serv.register_script(AGGREGATE_SCRIPT)
+        field = STAGE_TAG_FIELDS[stage]
+        complete, pending, pending_minions = self._aggregate_script(
+            keys=['deploy:{0}:minions'.format(repo_name)],
+            args=['deploy:{0}:minions:'.format(repo_name), field, tag,
+                  pending_limit],
+            client=serv)
+        return {'complete': int(complete),
+                'pending': int(pending),
+                'total': int(complete) + int(pending),
+                'pending_minions': pending_minions}
+
+    def _iter_minions_data(self, serv, repo_name):
+        # Stream the minions of a repo with SSCAN, reading their hashes in
+        # pipelined batches, so memory use doesn't grow with the fleet.
+        minions_key = 'deploy:{0}:minions'.format(repo_name)
+        batch_size = self._get_batch_size()
+        # SSCAN may return a member more than once while redis rehashes.
+        seen = set()
+        batch = []
+        for minion in serv.sscan_iter(minions_key, count=batch_size):
+            if minion in seen:
+                continue
+            seen.add(minion)
+            batch.append(minion)
+            if len(batch) >= batch_size:
+                for item in self._get_minions_data(serv, repo_name,
+                                                   batch).items():
+                    yield item
+                batch = []
+        if batch:
+            for item in self._get_minions_data(serv, repo_name,
+                                               batch).items():
+                yield item
+
+    def _get_stages_progress(self, tag, stages, pending_limit=0):
+        serv = self._get_redis_serv()
+        repo_name = self.conf.config['deploy.repo-name']
+        if self.conf.config['deploy.report-aggregation'] == 'server':
+            try:
+                return dict((stage,
+                             self._get_aggregate_counts(serv, repo_name, tag,
+                                                        stage, pending_limit))
+                            for stage in stages)
+            except redis.ResponseError as e:
+                LOG.debug('Server side aggregation failed, falling back to'
+                          ' client side aggregation: {0}'.format(e))
+        ret = {}
+        for stage in stages:
+            ret[stage] = {'complete': 0, 'pending': 0, 'total': 0,
+                          'pending_minions': []}
+        for minion, data in self._iter_minions_data(serv, repo_name):
+            for stage in stages:
+                progress = ret[stage]
+                progress['total'] += 1
+                if data[STAGE_TAG_FIELDS[stage]] == tag:
+                    progress['complete'] += 1
+                else:
+                    progress['pending'] += 1
+                    if (pending_limit < 0 or
+                            len(progress['pending_minions']) < pending_limit):
+                        progress['pending_minions'].append(minion)
+        return ret
+
+    def get_sync_progress(self, tag, stage, pending_limit=0):
+        """
+        Return the number of minions that have completed and that are
+        pending for the fetch or checkout stage of a tag, along with up to
+        pending_limit pending minion names (-1 for all).
+        """
+        return self._get_stages_progress(tag, [stage], pending_limit)[stage]
+
+    def get_minions(self):
+        """
+        Return the sorted names of all minions that report for the repo.
+        """
+        serv = self._get_redis_serv()
+        repo_name = self.conf.config['deploy.repo-name']
+        return sorted(serv.smembers('deploy:{0}:minions'.format(repo_name)))
+
+    def get_stage_status(self, tag, stage, minions):
+        """
+        Return, for each of the given minions, whether it has completed the
+        fetch or checkout stage of a tag, the status it last reported for
+        the stage and when it last finished the stage.
+        """
+        serv = self._get_redis_serv()
+        repo_name = self.conf.config['deploy.repo-name']
+        fields = [STAGE_TAG_FIELDS[stage], stage + '_status',
+                  stage + '_timestamp']
+        batch_size = self._get_batch_size()
+        ret = {}
+        for i in range(0, len(minions), batch_size):
+            batch = minions[i:i + batch_size]
+            pipe = serv.pipeline(transaction=False)
+            for minion in batch:
+                pipe.hmget('deploy:{0}:minions:{1}'.format(repo_name, minion),
+                           fields)
+            for minion, values in zip(batch, pipe.execute()):
+                minion_tag, status, timestamp = values
+                try:
+                    timestamp = float(timestamp)
+                except (TypeError, ValueError):
+                    timestamp = None
+                ret[minion] = {'complete': minion_tag == tag,
+                               'status': status,
+                               'timestamp': timestamp}
+        return ret
+
+    def _get_report_stages(self, report_type):
+        if report_type in STAGE_TAG_FIELDS:
+            return [report_type]
+        return ['fetch', 'checkout']
+
+    def _get_watch_channels(self, serv, repo_name):
+        # Returns the channel patterns to subscribe to and whether messages
+        # carry the minion name (a custom channel) or a key name (keyspace
+        # notifications). Returns no patterns if neither is available.
+        channel = self.conf.config['deploy.report-watch-channel']
+        if channel:
+            return [channel.format(repo_name)], True
+        try:
+            notify = serv.config_get('notify-keyspace-events')
+        except redis.ResponseError:
+            return [], False
+        flags = notify.get('notify-keyspace-events', '')
+        if 'K' not in flags or ('h' not in flags and 'A' not in flags):
+            return [], False
+        pattern = '__keyspace@{0}__:deploy:{1}:minions*'
+        return [pattern.format(self.conf.config['deploy.redis-db'],
+                               repo_name)], False
+
+    def _load_watch_state(self, serv, repo_name, tag, stages, minions,
+                          complete):
+        minions = list(minions)
+        fields = [STAGE_TAG_FIELDS[stage] for stage in stages]
+        batch_size = self._get_batch_size()
+        for i in range(0, len(minions), batch_size):
+            batch = minions[i:i + batch_size]
+            pipe = serv.pipeline(transaction=False)
+            for minion in batch:
+                pipe.hmget('deploy:{0}:minions:{1}'.format(repo_name, minion),
+                           fields)
+            for minion, values in zip(batch, pipe.execute()):
+                for stage, value in zip(stages, values):
+                    if value == tag:
+                        complete[stage].add(minion)
+                    else:
+                        complete[stage].discard(minion)
+
+    def _log_watch_progress(self, progress):
+        msgs = []
+        for stage, counts in progress:
+            msg = '{0}/{1} minions completed {2}'
+            msgs.append(msg.format(counts['complete'], counts['total'],
+                                   stage))
+        LOG.info('; '.join(msgs))
+
+    def _watch_done(self, progress):
+        for stage, counts in progress:
+            if not counts['total'] or counts['complete'] < counts['total']:
+                return False
+        return True
+
+    def _watch_notifications(self, serv, repo_name, tag, stages, channels,
+                             deadline, until):
+        patterns, named = channels
+        minions_key = 'deploy:{0}:minions'.format(repo_name)
+        minion_prefix = minions_key + ':'
+        pubsub = serv.pubsub()
+        pubsub.psubscribe(*patterns)
+        try:
+            # Subscribe before taking the initial snapshot, so that no
+            # check-in is missed between the two.
+            minions = serv.smembers(minions_key)
+            complete = dict((stage, set()) for stage in stages)
+            self._load_watch_state(serv, repo_name, tag, stages, minions,
+                                   complete)
+            last = None
+            while True:
+                progress = [(stage, {'complete': len(complete[stage]),
+                                     'total': len(minions)})
+                            for stage in stages]
+                if progress != last:
+                    self._log_watch_progress(progress)
+                    last = progress
+                if self._watch_done(progress):
+                    return progress
+                if deadline is not None and time.time() >= deadline:
+                    return progress
+                if until is not None and until():
+                    return progress
+                # Drain all pending notifications, then refresh the changed
+                # minions in a single pipelined round trip.
+                changed = set()
+                reload_minions = False
+                message = pubsub.get_message(timeout=POLL_MIN_INTERVAL)
+                while message:
+                    if message['type'] in ['message', 'pmessage']:
+                        if named:
+                            changed.add(message['data'])
+                        else:
+                            key = message['channel'].split('__:', 1)[-1]
+                            if key == minions_key:
+                                reload_minions = True
+                            elif key.startswith(minion_prefix):
+                                changed.add(key[len(minion_prefix):])
+                    message = pubsub.get_message()
+                if reload_minions:
+                    new_minions = serv.smembers(minions_key)
+                    changed.update(new_minions - minions)
+                    for stage in stages:
+                        complete[stage].intersection_update(new_minions)
+                    minions = new_minions
+                changed.intersection_update(minions)
+                if changed:
+                    self._load_watch_state(serv, repo_name, tag, stages,
+                                           changed, complete)
+        finally:
+            pubsub.close()
+
+    def _watch_poll(self, tag, stages, deadline, until):
+        interval = POLL_MIN_INTERVAL
+        last = None
+        while True:
+            counts = self._get_stages_progress(tag, stages)
+            progress = [(stage, {'complete': counts[stage]['complete'],
+                                 'total': counts[stage]['total']})
+                        for stage in stages]
+            if progress != last:
+                self._log_watch_progress(progress)
+                last = progress
+                interval = POLL_MIN_INTERVAL
+            else:
+                interval = min(interval * 2, POLL_MAX_INTERVAL)
+            if self._watch_done(progress):
+                return progress
+            if until is not None:
+                if until():
+                    return progress
+                # Notice quickly when the condition becomes true.
+                interval = POLL_MIN_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return progress
+                interval = min(interval, remaining)
+            time.sleep(interval)
+
+    def watch_sync(self, tag, report_type='full', timeout=None, until=None):
+        """
+        Display fetch and/or checkout progress as minions check in, until
+        all minions have completed, the timeout (in seconds) is reached,
+        the until callable returns True or the user interrupts the watch.
+        Progress is driven by redis keyspace notifications or a pub/sub
+        channel when available, otherwise by polling with an adaptive
+        interval.
+        """
         serv = self._get_redis_serv()
         repo_name = self.conf.config['deploy.repo-name']
+        stages = self._get_report_stages(report_type)
         LOG.info('Repo: {}'.format(repo_name))
         LOG.info('Tag: {}'.format(tag))
-        minions = serv.smembers('deploy:{0}:minions'.format(repo_name))
-        _fetch_info = self._get_fetch_info(serv, repo_name, minions, tag)
-        _checkout_info = self._get_checkout_info(serv, repo_name, minions, tag)
-        min_len = len(minions)
-        fetch_len = len(_fetch_info['complete'])
-        checkout_len = len(_checkout_info['complete'])
-        fetch_report = "{0}/{1} minions completed fetch"
-        fetch_report = fetch_report.format(fetch_len, min_len)
-        checkout_report = "{0}/{1} minions completed checkout"
-        checkout_report = checkout_report.format(checkout_len, min_len)
-        if report_type == 'fetch':
-            msgs = fetch_report
-        elif report_type == 'checkout':
-            msgs = checkout_report
+        LOG.info('Watching for progress, press Ctrl-C to stop.')
+        LOG.info('')
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        channels = self._get_watch_channels(serv, repo_name)
+        try:
+            if channels[0]:
+                try:
+                    return self._watch_notifications(serv, repo_name, tag,
+                                                     stages, channels,
+                                                     deadline, until)
+                except (AttributeError, redis.ResponseError) as e:
+                    # Older versions of redis-py lack get_message
+                    LOG.debug('Could not watch redis notifications, falling'
+                              ' back to polling: {0}'.format(e))
+            return self._watch_poll(tag, stages, deadline, until)
+        except KeyboardInterrupt:
+            LOG.info('')
+            return None
+
+    def _is_pending(self, data, stages, tag):
+        for stage in stages:
+            if data[STAGE_TAG_FIELDS[stage]] != tag:
+                return True
+        return False
+
+    def _filter_minions(self, minions_data, stages, tag, pending_only,
+                        status):
+        for minion, data in minions_data:
+            if pending_only and not self._is_pending(data, stages, tag):
+                continue
+            if status is not None:
+                statuses = [str(data[stage + '_status']) for stage in stages]
+                if str(status) not in statuses:
+                    continue
+            yield minion, data
+
+    def _sort_minions(self, minions_data, stages, sort, limit):
+        if sort == 'name':
+            key = lambda item: item[0]
+            reverse = False
+        elif sort == 'checkin':
+            # Slowest check-in first; minions that never checked in for a
+            # stage are considered the slowest.
+            def key(item):
+                checkins = [item[1][stage + '_checkin_mins']
+                            for stage in stages]
+                if None in checkins:
+                    return (True, 0)
+                return (False, max(checkins))
+            reverse = True
         else:
-            msgs = '{0}; {1}'.format(fetch_report, checkout_report)
-        LOG.info("")
-        LOG.info(msgs)
+            msg = 'Unknown sort order: {0}'.format(sort)
+            raise ReportDriverError(msg, 2)
+        # With a limit only the top entries need to be kept in memory.
+        if limit:
+            if reverse:
+                return heapq.nlargest(limit, minions_data, key=key)
+            return heapq.nsmallest(limit, minions_data, key=key)
+        return sorted(minions_data, key=key, reverse=reverse)
+
+    def _format_minion(self, minion, data, stages):
+        msg = ("{0} status: {1} [started: {2} mins ago,"
+               " last-return: {3} mins ago]")
+        msgs = []
+        for stage in stages:
+            msgs.append(msg.format(stage,
+                                   data[stage + '_status'],
+                                   data[stage + '_checkin_mins'],
+                                   data[stage + '_mins']))
+        return "{0}: {1}".format(minion,
+                                 ''.join(['\n\t' + m for m in msgs]))
+
+    def _percentiles(self, values):
+        # Nearest-rank percentiles
+        if not values:
+            return {'p50': None, 'p90': None, 'p99': None, 'max': None}
+        values = sorted(values)
+        ret = {'max': values[-1]}
+        for pct in [50, 90, 99]:
+            rank = int(math.ceil(pct / 100.0 * len(values)))
+            ret['p{0}'.format(pct)] = values[max(rank, 1) - 1]
+        return ret
+
+    def _collect_stats(self, minions_data, stages, tag, stats):
+        # Passes minions through unchanged, while accumulating per-stage
+        # aggregates into stats.
+        for stage in stages:
+            stats[stage] = {'complete': 0, 'pending': 0, 'statuses': {},
+                            'duration': [], 'checkin_age': []}
+        for minion, data in minions_data:
+            for stage in stages:
+                stage_stats = stats[stage]
+                if data[STAGE_TAG_FIELDS[stage]] == tag:
+                    stage_stats['complete'] += 1
+                else:
+                    stage_stats['pending'] += 1
+                status = str(data[stage + '_status'])
+                stage_stats['statuses'][status] = \
+                    stage_stats['statuses'].get(status, 0) + 1
+                for key in ['duration', 'checkin_age']:
+                    value = data[stage + '_' + key]
+                    if value is not None:
+                        stage_stats[key].append(value)
+            yield minion, data
+
+    def _get_minion_record(self, minion, data, stages, tag):
+        record = {'minion': minion}
+        for stage in stages:
+            record[stage] = {
+                'complete': data[STAGE_TAG_FIELDS[stage]] == tag,
+                'tag': data[STAGE_TAG_FIELDS[stage]],
+                'status': data[stage + '_status'],
+                'duration': data[stage + '_duration'],
+                'checkin_age': data[stage + '_checkin_age'],
+            }
+        return record
+
+    def _report_sync_data(self, serv, repo_name, tag, stages, output_format,
+                          detailed, pending_only, status, limit, sort):
+        stats = {}
+        collector = self._collect_stats(
+            self._iter_minions_data(serv, repo_name), stages, tag, stats)
+        minions_data = self._filter_minions(collector, stages, tag,
+                                            pending_only, status)
+        if sort:
+            minions_data = self._sort_minions(minions_data, stages, sort,
+                                              limit)
+        if limit:
+            minions_data = itertools.islice(minions_data, limit)
+        records = []
         if detailed:
-            LOG.info("")
-            LOG.info("Details:")
-            LOG.info("")
-            msg = ("{0} status: {1} [started: {2} mins ago,"
-                   " last-return: {3} mins ago]")
-            for minion in minions:
-                try:
-                    data = _fetch_info['pending'][minion]
-                except KeyError:
-                    if report_type == 'fetch':
-                        continue
-                    data = _fetch_info['complete'][minion]
-                fetch_msg = msg.format('fetch',
-                                       data['fetch_status'],
-                                       data['fetch_checkin_mins'],
-                                       data['fetch_mins'])
-                try:
-                    data = _checkout_info['pending'][minion]
-                except KeyError:
-                    if report_type == 'checkout':
-                        continue
-                    data = _checkout_info['complete'][minion]
-                checkout_msg = msg.format('checkout',
-                                          data['checkout_status'],
-                                          data['checkout_checkin_mins'],
-                                          data['checkout_mins'])
-                if report_type == 'fetch':
-                    msgs = '\n\t{}'.format(fetch_msg)
-                elif report_type == 'checkout':
-                    msgs = '\n\t{}'.format(checkout_msg)
+            for minion, data in minions_data:
+                record = self._get_minion_record(minion, data, stages, tag)
+                if output_format == 'ndjson':
+                    record['type'] = 'minion'
+                    sys.stdout.write(json.dumps(record) + '\n')
+                    sys.stdout.flush()
                 else:
-                    msgs = '\n\t{0}\n\t{1}'.format(fetch_msg, checkout_msg)
-                msgs = "{0}: {1}".format(minion, msgs)
-                LOG.info(msgs)
-
-    def _get_fetch_info(self, serv, repo_name, minions, tag):
-        ret = {'complete': {}, 'pending': {}}
-        for minion in minions:
-            data = self._get_minion_data(serv, repo_name, minion)
-            if data['fetch_tag'] == tag:
-                ret['complete'][minion] = data
-            else:
-                ret['pending'][minion] = data
-        return ret
+                    records.append(record)
+        # Aggregates cover every minion, regardless of filters and limits.
+        for _ in collector:
+            pass
+        summary = {'repo': repo_name, 'tag': tag, 'stages': {}}
+        for stage in stages:
+            stage_stats = stats[stage]
+            summary['minions'] = (stage_stats['complete'] +
+                                  stage_stats['pending'])
+            summary['stages'][stage] = {
+                'complete': stage_stats['complete'],
+                'pending': stage_stats['pending'],
+                'statuses': stage_stats['statuses'],
+                'duration': self._percentiles(stage_stats['duration']),
+                'checkin_age': self._percentiles(stage_stats['checkin_age']),
+            }
+        if output_format == 'ndjson':
+            summary['type'] = 'summary'
+        elif detailed:
+            summary['details'] = records
+        sys.stdout.write(json.dumps(summary) + '\n')
+        sys.stdout.flush()
 
-    def _get_checkout_info(self, serv, repo_name, minions, tag):
-        ret = {'complete': {}, 'pending': {}}
-        for minion in minions:
-            data = self._get_minion_data(serv, repo_name, minion)
-            if data['tag'] == tag:
-                ret['complete'][minion] = data
-            else:
-                ret['pending'][minion] = data
+    def report_sync(self, tag, report_type='full', detailed=False,
+                    pending_only=False, status=None, limit=None, sort=None,
+                    output_format='text'):
+        serv = self._get_redis_serv()
+        repo_name = self.conf.config['deploy.repo-name']
+        stages = self._get_report_stages(report_type)
+        if output_format in ['json', 'ndjson']:
+            self._report_sync_data(serv, repo_name, tag, stages,
+                                   output_format, detailed, pending_only,
+                                   status, limit, sort)
+            return
+        elif output_format != 'text':
+            msg = 'Unknown report format: {0}'.format(output_format)
+            raise ReportDriverError(msg, 3)
+        LOG.info('Repo: {}'.format(repo_name))
+        LOG.info('Tag: {}'.format(tag))
+        progress = self._get_stages_progress(tag, stages)
+        msgs = []
+        for stage in stages:
+            msg = "{0}/{1} minions completed {2}"
+            msgs.append(msg.format(progress[stage]['complete'],
+                                   progress[stage]['total'],
+                                   stage))
+        LOG.info("")
+        LOG.info('; '.join(msgs))
+        if not detailed:
+            return
+        LOG.info("")
+        LOG.info("Details:")
+        LOG.info("")
+        # Reports for a single stage only list the minions still pending.
+        if report_type in STAGE_TAG_FIELDS:
+            pending_only = True
+        minions_data = self._iter_minions_data(serv, repo_name)
+        minions_data = self._filter_minions(minions_data, stages, tag,
+                                            pending_only, status)
+        if sort:
+            minions_data = self._sort_minions(minions_data, stages, sort,
+                                              limit)
+        if limit:
+            minions_data = itertools.islice(minions_data, limit)
+        for minion, data in minions_data:
+            LOG.info(self._format_minion(minion, data, stages))
+
+    def _restart_state(self, data, since):
+        # Whether a minion's last restart returned, is running or hasn't
+        # started since the restart being reported on.
+        checkin = data['restart_checkin_time'] or 0
+        finished = data['restart_time'] or 0
+        if finished and finished >= since and finished >= checkin:
+            return 'restarted'
+        if checkin and checkin >= since:
+            return 'restarting'
+        return 'pending'
+
+    def _get_restart_progress(self, since, pending_limit=0):
+        serv = self._get_redis_serv()
+        repo_name = self.conf.config['deploy.repo-name']
+        since = since or 0
+        if self.conf.config['deploy.report-aggregation'] == 'server':
+            try:
+                aggregate = serv.register_script(RESTART_AGGREGATE_SCRIPT)
+                ret = aggregate(
+                    keys=['deploy:{0}:minions'.format(repo_name)],
+                    args=['deploy:{0}:minions:'.format(repo_name), since,
+                          pending_limit])
+                restarted, restarting, pending, status_counts, names = ret
+                statuses = dict(zip(status_counts[::2],
+                                    [int(c) for c in status_counts[1::2]]))
+                return {'restarted': restarted, 'restarting': restarting,
+                        'pending': pending,
+                        'total': restarted + restarting + pending,
+                        'statuses': statuses, 'pending_minions': names}
+            except redis.ResponseError as e:
+                LOG.debug('Server side aggregation failed, falling back to'
+                          ' client side aggregation: {0}'.format(e))
+        ret = {'restarted': 0, 'restarting': 0, 'pending': 0, 'total': 0,
+               'statuses': {}, 'pending_minions': []}
+        for minion, data in self._iter_minions_data(serv, repo_name):
+            state = self._restart_state(data, since)
+            ret[state] += 1
+            ret['total'] += 1
+            if state == 'restarted':
+                status = str(data['restart_status'])
+                ret['statuses'][status] = ret['statuses'].get(status, 0) + 1
+            elif state == 'pending':
+                if (pending_limit < 0 or
+                        len(ret['pending_minions']) < pending_limit):
+                    ret['pending_minions'].append(minion)
         return ret
+
+    def _format_restart_progress(self, progress):
+        msg = '{0}/{1} minions restarted; {2} restarting; {3} pending'
+        return msg.format(progress['restarted'], progress['total'],
+                          progress['restarting'], progress['pending'])
+
+    def _filter_restarts(self, minions_data, since, pending_only, status):
+        for minion, data in minions_data:
+            state = self._restart_state(data, since)
+            if pending_only and state == 'restarted':
+                continue
+            if status is not None:
+                if (state != 'restarted' or
+                        str(data['restart_status']) != str(status)):
+                    continue
+            yield minion, data
+
+    def _collect_restart_stats(self, minions_data, since, stats):
+        # Passes minions through unchanged, while accumulating restart
+        # aggregates into stats.
+        stats.update({'restarted': 0, 'restarting': 0, 'pending': 0,
+                      'statuses': {}, 'duration': []})
+        for minion, data in minions_data:
+            state = self._restart_state(data, since)
+            stats[state] += 1
+            if state == 'restarted':
+                status = str(data['restart_status'])
+                stats['statuses'][status] = \
+                    stats['statuses'].get(status, 0) + 1
+                if data['restart_duration'] is not None:
+                    stats['duration'].append(data['restart_duration'])
+            yield minion, data
+
+    def _report_service_data(self, serv, repo_name, since, output_format,
+                             detailed, pending_only, status, limit, sort):
+        stats = {}
+        collector = self._collect_restart_stats(
+            self._iter_minions_data(serv, repo_name), since, stats)
+        minions_data = self._filter_restarts(collector, since, pending_only,
+                                             status)
+        if sort:
+            minions_data = self._sort_minions(minions_data, ['restart'],
+                                              sort, limit)
+        if limit:
+            minions_data = itertools.islice(minions_data, limit)
+        records = []
+        if detailed:
+            for minion, data in minions_data:
+                record = self._get_restart_record(minion, data, since)
+                if output_format == 'ndjson':
+                    record['type'] = 'minion'
+                    sys.stdout.write(json.dumps(record) + '\n')
+                    sys.stdout.flush()
+                else:
+                    records.append(record)
+        # Aggregates cover every minion, regardless of filters and limits.
+        for _ in collector:
+            pass
+        summary = {
+            'repo': repo_name,
+            'since': since or None,
+            'minions': (stats['restarted'] + stats['restarting'] +
+                        stats['pending']),
+            'restarted': stats['restarted'],
+            'restarting': stats['restarting'],
+            'pending': stats['pending'],
+            'statuses': stats['statuses'],
+            'duration': self._percentiles(stats['duration']),
+        }
+        if output_format == 'ndjson':
+            summary['type'] = 'summary'
+        elif detailed:
+            summary['details'] = records
+        sys.stdout.write(json.dumps(summary) + '\n')
+        sys.stdout.flush()
+
+    def _get_restart_record(self, minion, data, since):
+        return {
+            'minion': minion,
+            'state': self._restart_state(data, since),
+            'status': data['restart_status'],
+            'duration': data['restart_duration'],
+            'checkin_age': data['restart_checkin_age'],
+        }
+
+    def report_service(self, since, detailed=False, pending_only=False,
+                       status=None, limit=None, sort=None,
+                       output_format='text'):
+        """
+        Report the progress and statuses of the service restart started at
+        the since timestamp, or of the last restart of each minion when
+        since is None.
+        """
+        serv = self._get_redis_serv()
+        repo_name = self.conf.config['deploy.repo-name']
+        since = since or 0
+        if output_format in ['json', 'ndjson']:
+            self._report_service_data(serv, repo_name, since, output_format,
+                                      detailed, pending_only, status, limit,
+                                      sort)
+            return
+        elif output_format != 'text':
+            msg = 'Unknown report format: {0}'.format(output_format)
+            raise ReportDriverError(msg, 3)
+        LOG.info('Repo: {}'.format(repo_name))
+        if since:
+            LOG.info('Restart started: {}'.format(
+                datetime.fromtimestamp(since).strftime('%Y-%m-%d %H:%M:%S')))
+        progress = self._get_restart_progress(since)
+        LOG.info("")
+        LOG.info(self._format_restart_progress(progress))
+        if progress['statuses']:
+            LOG.info('Statuses: {0}'.format(', '.join(
+                '{0}: {1}'.format(restart_status, count)
+                for restart_status, count
+                in sorted(progress['statuses'].items()))))
+        if not detailed:
+            return
+        LOG.info("")
+        LOG.info("Details:")
+        LOG.info("")
+        minions_data = self._iter_minions_data(serv, repo_name)
+        minions_data = self._filter_restarts(minions_data, since,
+                                             pending_only, status)
+        if sort:
+            minions_data = self._sort_minions(minions_data, ['restart'],
+                                              sort, limit)
+        if limit:
+            minions_data = itertools.islice(minions_data, limit)
+        for minion, data in minions_data:
+            LOG.info(self._format_minion(minion, data, ['restart']))
+
+    def watch_service(self, since, timeout=None):
+        """
+        Display service restart progress until every minion has returned,
+        the timeout (in seconds) is reached or the user interrupts the
+        watch.
+        """
+        repo_name = self.conf.config['deploy.repo-name']
+        LOG.info('Repo: {}'.format(repo_name))
+        LOG.info('Watching for progress, press Ctrl-C to stop.')
+        LOG.info('')
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        interval = POLL_MIN_INTERVAL
+        last = None
+        try:
+            while True:
+                progress = self._get_restart_progress(since)
+                msg = self._format_restart_progress(progress)
+                if msg != last:
+                    LOG.info(msg)
+                    last = msg
+                    interval = POLL_MIN_INTERVAL
+                else:
+                    interval = min(interval * 2, POLL_MAX_INTERVAL)
+                if (progress['total'] and
+                        progress['restarted'] == progress['total']):
+                    return progress
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return progress
+                    interval = min(interval, remaining)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            LOG.info('')
+            return None
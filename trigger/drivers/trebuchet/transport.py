@@ -0,0 +1,285 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Transports used by the trebuchet drivers to call salt runners.
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+import subprocess
+import trigger.config as config
+
+LOG = config.LOG
+
+# Bytes read at a time when streaming salt-call output
+STREAM_CHUNK_SIZE = 65536
+
+TRANSPORT_CONFIG = {
+    'deploy.runner-transport': {
+        'required': False,
+        'default': 'salt-call'
+    },
+}
+
+
+class TransportError(Exception):
+
+    def __init__(self, message, errorno):
+        Exception.__init__(self, message)
+        self.errorno = errorno
+
+    def __str__(self):
+        return self.message
+
+
+class RunnerTransport(object):
+    """Calls trebuchet's salt runners."""
+
+    def __init__(self, conf):
+        self.conf = conf
+
+    def run(self, fun, arg):
+        """
+        Call the runner function fun with the comma separated argument
+        string arg, and return the runner's return data.
+        """
+        raise NotImplementedError
+
+    def publish(self, minions, fun, arg):
+        """
+        Call the minion function fun on the listed minions, with the comma
+        separated argument string arg, and return the minions' returns.
+        Returns are also sent to trebuchet's redis returner, as the
+        runners do.
+        """
+        raise NotImplementedError
+
+    def stream(self, fun, arg):
+        """
+        Call the runner function fun like run, but yield the items of a
+        list return one at a time. An error string returned by salt raises
+        a TransportError; any other return that isn't a list is yielded
+        whole.
+        """
+        ret = self.run(fun, arg)
+        if isinstance(ret, basestring):
+            msg = 'Error received from salt; raw output:\n\n{0}'
+            raise TransportError(msg.format(ret), 2)
+        if isinstance(ret, list):
+            for item in ret:
+                yield item
+        else:
+            yield ret
+
+
+class SaltCallTransport(RunnerTransport):
+    """Calls runners through sudo salt-call, one process per call."""
+
+    def _salt_call(self, args):
+        p = subprocess.Popen(['sudo', 'salt-call', '-l', 'quiet',
+                              '--out=json'] + args,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        if p.returncode:
+            msg = 'salt-call exited with {0}; raw output:\n\n{1}'
+            raise TransportError(msg.format(p.returncode, err or out), 3)
+        try:
+            return json.loads(out)['local']
+        except (ValueError, KeyError, TypeError):
+            msg = 'Could not parse salt return; raw output:\n\n{0}'
+            raise TransportError(msg.format(out), 1)
+
+    def run(self, fun, arg):
+        return self._salt_call(['publish.runner', fun, arg])
+
+    def _read_chunk(self, p, buf):
+        chunk = os.read(p.stdout.fileno(), STREAM_CHUNK_SIZE)
+        if not chunk:
+            msg = 'Could not parse salt return; raw output:\n\n{0}'
+            raise TransportError(msg.format(buf), 1)
+        return buf + chunk
+
+    def _iter_return(self, p):
+        # Decodes the items of the runner's return list as they are read,
+        # so only one item is held in memory at a time.
+        decoder = json.JSONDecoder()
+        buf = ''
+        while True:
+            start = buf.find('"local":')
+            if start != -1 and buf[start + 8:].strip():
+                buf = buf[start + 8:].lstrip()
+                break
+            buf = self._read_chunk(p, buf)
+        if not buf.startswith('['):
+            # Not a list, such as an error string.
+            rest = p.stdout.read()
+            try:
+                ret = decoder.raw_decode(buf + rest)[0]
+            except ValueError:
+                msg = 'Could not parse salt return; raw output:\n\n{0}'
+                raise TransportError(msg.format(buf + rest), 1)
+            if isinstance(ret, basestring):
+                msg = 'Error received from salt; raw output:\n\n{0}'
+                raise TransportError(msg.format(ret), 2)
+            yield ret
+            return
+        buf = buf[1:]
+        while True:
+            buf = buf.lstrip().lstrip(',').lstrip()
+            if buf.startswith(']'):
+                return
+            if buf:
+                try:
+                    item, end = decoder.raw_decode(buf)
+                except ValueError:
+                    # The item hasn't been read completely yet.
+                    pass
+                else:
+                    yield item
+                    buf = buf[end:]
+                    continue
+            buf = self._read_chunk(p, buf)
+
+    def stream(self, fun, arg):
+        # stderr goes to a file, so a chatty salt-call can't block on a
+        # full pipe while stdout is being read.
+        err = tempfile.TemporaryFile()
+        p = subprocess.Popen(['sudo', 'salt-call', '-l', 'quiet',
+                              '--out=json', 'publish.runner', fun, arg],
+                             stdout=subprocess.PIPE,
+                             stderr=err)
+        try:
+            for item in self._iter_return(p):
+                yield item
+            p.stdout.read()
+        except TransportError as e:
+            if e.errorno == 1 and p.wait():
+                err.seek(0)
+                msg = 'salt-call exited with {0}; raw output:\n\n{1}'
+                raise TransportError(msg.format(p.returncode, err.read()), 3)
+            raise
+        finally:
+            p.stdout.close()
+            err.close()
+        if p.wait():
+            msg = 'salt-call exited with {0}'
+            raise TransportError(msg.format(p.returncode), 3)
+
+    def publish(self, minions, fun, arg):
+        return self._salt_call(['publish.publish', ','.join(minions), fun,
+                                arg, 'list', 'deploy_redis'])
+
+
+class SaltClientTransport(RunnerTransport):
+    """
+    Calls runners through an in-process salt caller, which is created once
+    and reused for every call. This avoids the interpreter startup, salt
+    module loading and sudo overhead of salt-call, but requires salt to be
+    importable and the minion configuration to be readable by the deployer.
+    Salt callers aren't thread-safe, so calls made from concurrent runner
+    threads take turns on the shared caller.
+    """
+
+    def __init__(self, conf):
+        RunnerTransport.__init__(self, conf)
+        self._caller = None
+        self._lock = threading.Lock()
+
+    def _get_caller(self):
+        if self._caller is None:
+            try:
+                import salt.client
+            except ImportError:
+                msg = 'The salt-client transport requires salt to be installed'
+                raise TransportError(msg, 3)
+            try:
+                self._caller = salt.client.Caller()
+            except Exception as e:
+                msg = 'Failed to create a salt caller: {0}'.format(e)
+                raise TransportError(msg, 3)
+        return self._caller
+
+    def _cmd(self, fun, *args):
+        with self._lock:
+            caller = self._get_caller()
+            try:
+                return caller.cmd(*args)
+            except Exception as e:
+                msg = 'Salt call to {0} failed: {1}'.format(fun, e)
+                raise TransportError(msg, 3)
+
+    def run(self, fun, arg):
+        return self._cmd(fun, 'publish.runner', fun, arg)
+
+    def publish(self, minions, fun, arg):
+        return self._cmd(fun, 'publish.publish', ','.join(minions), fun, arg,
+                         'list', 'deploy_redis')
+
+
+class LocalTransport(RunnerTransport):
+    """
+    Stand-in transport for testing, which records and logs runner calls
+    instead of calling salt.
+    """
+
+    def __init__(self, conf):
+        RunnerTransport.__init__(self, conf)
+        self.calls = []
+
+    def run(self, fun, arg):
+        LOG.info('Local transport: {0}({1})'.format(fun, arg))
+        self.calls.append((fun, arg))
+        return []
+
+    def publish(self, minions, fun, arg):
+        LOG.info('Local transport: {0}({1}) on {2}'.format(fun, arg,
+                                                           ','.join(minions)))
+        self.calls.append((fun, arg, list(minions)))
+        return {}
+
+
+TRANSPORTS = {
+    'salt-call': SaltCallTransport,
+    'salt-client': SaltClientTransport,
+    'local': LocalTransport,
+}
+
+_transport = None
+
+
+def get_transport(conf):
+    """
+    Return the configured runner transport. The transport is created once
+    per process and shared by all drivers.
+    """
+    global _transport
+    if _transport is None:
+        name = conf.config['deploy.runner-transport']
+        if name in TRANSPORTS:
+            transport_class = TRANSPORTS[name]
+        else:
+            # Allow transports to be provided as module.Class
+            mod, _, cls = name.rpartition('.')
+            try:
+                __import__(mod)
+                transport_class = getattr(sys.modules[mod], cls)
+            except (ValueError, ImportError, AttributeError, KeyError):
+                msg = 'Failed to import runner transport: {0}'.format(name)
+                raise TransportError(msg, 3)
+        _transport = transport_class(conf)
+    return _transport
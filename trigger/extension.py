@@ -11,9 +11,186 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import imp
+import sys
+import glob
+import json
+
+from trigger import config
+
+LOG = config.LOG
+
+# setuptools entry point group extensions can be registered under.
+ENTRY_POINT_GROUP = 'trigger.extensions'
+MANIFEST_VERSION = 1
+
+
 class Extension(object):
     """Extension descriptor."""
 
-    def __init__(self, name, module):
+    def __init__(self, name, module=None, path=None, entry_point=None,
+                 actions=None):
         self.name = name
-        self.module = module
+        self.path = path
+        # 'module' or 'module:attr' for extensions from entry points
+        self.entry_point = entry_point
+        self._module = module
+        self._actions = actions
+
+    @property
+    def module(self):
+        if self._module is None:
+            if self.path:
+                self._module = imp.load_source(self.name, self.path)
+            else:
+                mod, _, attrs = self.entry_point.partition(':')
+                __import__(mod)
+                module = sys.modules[mod]
+                for attr in filter(None, attrs.split('.')):
+                    module = getattr(module, attr)
+                self._module = module
+        return self._module
+
+    @property
+    def actions(self):
+        if self._actions is None:
+            self._actions = get_actions(self.module)
+        return self._actions
+
+    def to_manifest(self):
+        actions = self.actions
+        try:
+            json.dumps(actions)
+        except (TypeError, ValueError):
+            # Arguments that can't be cached (types, actions, etc.) mean
+            # the extension must be imported to build its parser.
+            actions = None
+        return {'name': self.name,
+                'path': self.path,
+                'entry_point': self.entry_point,
+                'actions': actions}
+
+
+class ExtensionAction(object):
+    """Calls an extension's action, importing the extension on first use."""
+
+    def __init__(self, ext, attr):
+        self.ext = ext
+        self.attr = attr
+
+    def __call__(self, args):
+        return getattr(self.ext.module, self.attr)(args)
+
+
+def get_actions(actions_module):
+    """Describe the do_ functions of a module as cli actions."""
+    actions = []
+    for attr in (a for a in dir(actions_module) if a.startswith('do_')):
+        callback = getattr(actions_module, attr)
+        desc = callback.__doc__ or ''
+        actions.append({
+            # I prefer to be hyphen-separated instead of underscores.
+            'command': attr[3:].replace('_', '-'),
+            'attr': attr,
+            'help': desc.strip(),
+            'description': desc,
+            'arguments': getattr(callback, 'arguments', []),
+        })
+    return actions
+
+
+def _get_manifest_file():
+    cache_dir = os.environ.get('XDG_CACHE_HOME',
+                               os.path.join(os.path.expanduser('~'),
+                                            '.cache'))
+    return os.path.join(cache_dir, 'trigger', 'extensions.json')
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _get_manifest_key(ext_paths):
+    # Installing or removing a distribution changes the mtime of its
+    # sys.path directory, which covers extensions from entry points.
+    return {'paths': dict((path, _get_mtime(path)) for path in ext_paths),
+            'sys_path': dict((path, _get_mtime(path))
+                             for path in sys.path if path),
+            'executable': sys.executable}
+
+
+def _load_manifest(key):
+    try:
+        with open(_get_manifest_file(), 'r') as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if (manifest.get('version') != MANIFEST_VERSION or
+            manifest.get('key') != key):
+        return None
+    extensions = []
+    for item in manifest['extensions']:
+        extensions.append(Extension(item['name'],
+                                    path=item['path'],
+                                    entry_point=item['entry_point'],
+                                    actions=item['actions']))
+    return extensions
+
+
+def _save_manifest(key, extensions):
+    manifest_file = _get_manifest_file()
+    manifest = {'version': MANIFEST_VERSION,
+                'key': key,
+                'extensions': [ext.to_manifest() for ext in extensions]}
+    tmp_file = '{0}.{1}'.format(manifest_file, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(manifest_file)):
+            os.makedirs(os.path.dirname(manifest_file))
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f)
+        os.rename(tmp_file, manifest_file)
+    except (IOError, OSError):
+        LOG.debug('Failed to write extension manifest: {0}'.format(
+            manifest_file))
+
+
+def _discover_via_entry_points():
+    # pkg_resources is slow to import, so it's only used when the manifest
+    # needs to be rebuilt.
+    try:
+        import pkg_resources
+    except ImportError:
+        return
+    for entry_point in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP):
+        name = entry_point.module_name
+        if entry_point.attrs:
+            name = '{0}:{1}'.format(name, '.'.join(entry_point.attrs))
+        yield Extension(entry_point.name, entry_point=name)
+
+
+def discover_extensions(ext_dir):
+    """
+    Find extensions in ext_dir and registered through setuptools entry
+    points. Their actions are read from a manifest cached across runs, so
+    extensions are only imported when one of their actions is invoked.
+    """
+    ext_paths = []
+    for ext_path in sorted(glob.glob(os.path.join(ext_dir, '*.py'))):
+        if os.path.basename(ext_path) != '__init__.py':
+            ext_paths.append(ext_path)
+    key = _get_manifest_key(ext_paths)
+    extensions = _load_manifest(key)
+    if extensions is not None:
+        return extensions
+    LOG.debug('Rebuilding extension manifest')
+    extensions = []
+    for ext_path in ext_paths:
+        name = os.path.basename(ext_path)[:-3]
+        extensions.append(Extension(name, path=ext_path))
+    extensions.extend(_discover_via_entry_points())
+    _save_manifest(key, extensions)
+    return extensions
@@ -0,0 +1,196 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Timing of deployment phases, and sinks that emit the timings as metrics.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import socket
+import contextlib
+import trigger.config as config
+
+LOG = config.LOG
+
+# Keep statsd packets within a safe UDP payload size
+STATSD_MAX_PACKET = 512
+
+
+class MetricsError(Exception):
+
+    def __init__(self, message, errorno):
+        Exception.__init__(self, message)
+        self.errorno = errorno
+
+    def __str__(self):
+        return self.message
+
+
+class Timings(object):
+    """Durations of the deployment phases run by this process, in order."""
+
+    def __init__(self):
+        self._timings = []
+
+    def record(self, name, seconds):
+        self._timings.append((name, seconds))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - start)
+
+    def items(self):
+        return list(self._timings)
+
+    def clear(self):
+        self._timings = []
+
+
+_timings = None
+
+
+def get_timings():
+    """
+    Return the timings of this process, which are shared by the shell and
+    the drivers.
+    """
+    global _timings
+    if _timings is None:
+        _timings = Timings()
+    return _timings
+
+
+class MetricsSink(object):
+
+    def __init__(self, conf):
+        self.conf = conf
+
+    def emit(self, timings, tags):
+        """
+        Emit timings, a list of (phase, seconds), for the repo, tag and
+        action in tags.
+        """
+        raise NotImplementedError
+
+
+class StatsdSink(MetricsSink):
+    """
+    Sends each phase as a statsd timer named
+    <prefix>.<repo>.<action>.<phase>, over UDP.
+    """
+
+    def _metric_name(self, *parts):
+        return '.'.join(re.sub(r'[^A-Za-z0-9_-]', '_', str(part))
+                        for part in parts if part)
+
+    def emit(self, timings, tags):
+        try:
+            port = int(self.conf.config['deploy.metrics-statsd-port'])
+        except (TypeError, ValueError):
+            raise MetricsError('deploy.metrics-statsd-port must be an'
+                               ' integer', 1)
+        address = (self.conf.config['deploy.metrics-statsd-host'], port)
+        lines = []
+        for name, seconds in timings:
+            metric = self._metric_name(
+                self.conf.config['deploy.metrics-statsd-prefix'],
+                tags['repo'], tags['action'], name)
+            lines.append('{0}:{1:d}|ms'.format(metric,
+                                               int(round(seconds * 1000))))
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            packet = ''
+            for line in lines:
+                if packet and len(packet) + len(line) + 1 > STATSD_MAX_PACKET:
+                    sock.sendto(packet, address)
+                    packet = ''
+                packet = packet + '\n' + line if packet else line
+            if packet:
+                sock.sendto(packet, address)
+        finally:
+            sock.close()
+
+
+class FileSink(MetricsSink):
+    """Appends the timings of each run as a line of JSON to a file."""
+
+    def emit(self, timings, tags):
+        path = self.conf.config['deploy.metrics-file']
+        if not path:
+            path = os.path.join(self.conf.repo.git_dir, 'deploy',
+                                'metrics.log')
+        record = dict(tags)
+        record['time'] = time.time()
+        record['timings'] = [{'phase': name, 'seconds': seconds}
+                             for name, seconds in timings]
+        f = open(path, 'a')
+        try:
+            f.write(json.dumps(record) + '\n')
+        finally:
+            f.close()
+
+
+SINKS = {
+    'statsd': StatsdSink,
+    'file': FileSink,
+}
+
+
+def get_sinks(conf):
+    """
+    Return the sinks listed in deploy.metrics-sinks. Sinks can also be
+    provided as module.Class.
+    """
+    sinks = []
+    names = conf.config['deploy.metrics-sinks']
+    if not names:
+        return sinks
+    for name in str(names).split(','):
+        name = name.strip()
+        if name in SINKS:
+            sink_class = SINKS[name]
+        else:
+            mod, _, cls = name.rpartition('.')
+            try:
+                __import__(mod)
+                sink_class = getattr(sys.modules[mod], cls)
+            except (ValueError, ImportError, AttributeError, KeyError):
+                msg = 'Failed to import metrics sink: {0}'.format(name)
+                raise MetricsError(msg, 1)
+        sinks.append(sink_class(conf))
+    return sinks
+
+
+def emit(conf, timings, tags):
+    """
+    Emit timings to every configured sink. Failing sinks are logged, as
+    metrics should never fail a deployment.
+    """
+    try:
+        sinks = get_sinks(conf)
+    except MetricsError as e:
+        LOG.warning(e.message)
+        return
+    for sink in sinks:
+        try:
+            sink.emit(timings, tags)
+        except (MetricsError, IOError, OSError, socket.error) as e:
+            LOG.warning('Failed to emit metrics: {0}'.format(e))
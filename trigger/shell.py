@@ -17,13 +17,15 @@ Git command-line interface for trebuchet
 """
 
 import os
-import imp
 import sys
-import glob
+import time
 import argparse
+import threading
+import subprocess
 
 from trigger import utils
 from trigger import config
+from trigger import metrics
 from trigger import extension
 from trigger.drivers import LockDriverError
 from trigger.drivers import SyncDriverError
@@ -31,10 +33,17 @@ from trigger.drivers import ServiceDriverError
 from trigger.drivers import ReportDriverError
 from trigger.config import ConfigurationError
 from datetime import datetime
-from git import GitCommandError
 
 LOG = config.LOG
 
+DRIVERS = ['sync-driver', 'lock-driver', 'service-driver', 'report-driver']
+
+# Config keys whose values are masked by the config subcommand
+SECRET_CONFIG_WORDS = ('password', 'secret')
+
+# Matches the '%Y%m%d-%H%M%S' timestamp of deployment tags
+TAG_TIMESTAMP_PATTERN = '[0-9]' * 8 + '-' + '[0-9]' * 6
+
 
 class TriggerError(Exception):
 
@@ -48,29 +57,38 @@ class TriggerError(Exception):
 
 class Trigger(object):
 
-    def __init__(self, conf):
+    def __init__(self, conf=None):
+        # The configuration is loaded by main once a subcommand that needs
+        # it has been parsed, unless it is passed in.
         self.conf = conf
-        self._lock_driver = self.conf.drivers['lock-driver']
-        self._sync_driver = self.conf.drivers['sync-driver']
-        self._service_driver = self.conf.drivers['service-driver']
-        self._report_driver = self.conf.drivers['report-driver']
+
+    @property
+    def _lock_driver(self):
+        return self.conf.drivers['lock-driver']
+
+    @property
+    def _sync_driver(self):
+        return self.conf.drivers['sync-driver']
+
+    @property
+    def _service_driver(self):
+        return self.conf.drivers['service-driver']
+
+    @property
+    def _report_driver(self):
+        return self.conf.drivers['report-driver']
 
     def do_start(self, args):
         """
         Start a deployment for this repository and hold the deployment lock.
         """
-        lock_info = self._lock_driver.check_lock(args)
-        if lock_info:
-            if lock_info['user']:
-                message = ('A deployment has already been started for this'
-                           ' repo by {0}.').format(lock_info['user'])
-            else:
-                message = ('A deployment has already been started for this'
-                           ' repo.')
-            raise TriggerError(message, 100)
+        # Acquiring the lock is atomic; the lock driver fails with errorno 2
+        # if a deployment has already been started.
         try:
             self._lock_driver.add_lock(args)
         except LockDriverError as e:
+            if e.errorno == 2:
+                raise TriggerError(e.message, 100)
             LOG.error(e.message)
             raise TriggerError('Failed to start deployment', 101)
         try:
@@ -101,6 +119,8 @@ class Trigger(object):
         Abort this deployment, resetting the local repository back to the
         start tag.
         """
+        from git import GitCommandError
+
         lock_info = self._lock_driver.check_lock(args)
         if not lock_info:
             message = 'There is no deployment to abort.'
@@ -133,6 +153,43 @@ class Trigger(object):
                action='store_true',
                default=False,
                help='Force a sync even if nothing changed locally.')
+    @utils.arg('--auto',
+               dest='auto',
+               action='store_true',
+               default=False,
+               help='Continue through the fetch and checkout stages without'
+                    ' prompting, once the completion thresholds are met.')
+    @utils.arg('--fetch-threshold',
+               dest='fetch_threshold',
+               default=None,
+               help='Percentage of minions that must complete the fetch'
+                    ' stage before continuing with --auto.')
+    @utils.arg('--checkout-threshold',
+               dest='checkout_threshold',
+               default=None,
+               help='Percentage of minions that must complete the checkout'
+                    ' stage before finishing with --auto.')
+    @utils.arg('--stage-timeout',
+               dest='stage_timeout',
+               default=None,
+               help='Seconds to wait for each stage to reach its threshold'
+                    ' with --auto before failing.')
+    @utils.arg('--fetch-concurrency',
+               dest='fetch_concurrency',
+               default=None,
+               help='Maximum number or percentage of minions fetching at'
+                    ' once.')
+    @utils.arg('--waves',
+               dest='waves',
+               default=None,
+               help='Check out in waves before checking out to all minions,'
+                    ' as a comma separated list of minion counts or'
+                    ' percentages, for instance 1%%,10%%.')
+    @utils.arg('--wave-max-failures',
+               dest='wave_max_failures',
+               default=None,
+               help='Number of minions that may fail the checkout before'
+                    ' stopping a rollout in waves.')
     def do_sync(self, args):
         """
         Synchronize the current state of the local repository to all
@@ -141,22 +198,152 @@ class Trigger(object):
         if not self._lock_driver.check_lock(args):
             message = 'A deployment has not been started.'
             raise TriggerError(message, 160)
-        if self.conf.repo.is_dirty():
+        timings = metrics.get_timings()
+        with timings.phase('dirty_check'):
+            dirty = self._is_dirty()
+        if dirty:
             message = ('The repository is dirty. Please commit or revert any'
                        ' uncommitted changes.')
             raise TriggerError(message, 161)
-        tag = self._write_tag('sync')
+        with timings.phase('tag_write'):
+            tag = self._write_tag('sync')
+        heartbeat = self._start_heartbeat(args)
         try:
             # TODO (ryan-lane): Add logging call here
-            self._sync_driver.sync(tag, args)
+            with timings.phase('sync'):
+                self._sync_driver.sync(tag, args)
         except SyncDriverError as e:
             raise TriggerError(e.message, 163)
+        finally:
+            self._stop_heartbeat(heartbeat, args)
         try:
             self._lock_driver.remove_lock(args)
         except LockDriverError as e:
             raise TriggerError(e.message, 131)
-        # TODO (ryan-lane): display amount of time of deployment
+        self._report_timings('sync', tag.name, deployment=True)
         LOG.info('Deployment finished.')
+        self._gc_after_finish()
+
+    def _get_deployment_time(self):
+        # Seconds since the deployment's start tag was written.
+        tag = self._get_latest_tag('start')
+        if tag is None:
+            return None
+        try:
+            start = datetime.strptime(tag.name[-15:], '%Y%m%d-%H%M%S')
+        except ValueError:
+            return None
+        return (datetime.now() - start).total_seconds()
+
+    def _report_timings(self, action, tag, deployment=False):
+        timings = metrics.get_timings().items()
+        if deployment:
+            seconds = self._get_deployment_time()
+            if seconds is not None:
+                timings.append(('deployment', seconds))
+        if not timings:
+            return
+        LOG.info('Timings:')
+        for name, seconds in timings:
+            LOG.info('  {0}: {1:.2f}s'.format(name, seconds))
+        metrics.emit(self.conf, timings,
+                     {'repo': self.conf.config['deploy.repo-name'],
+                      'tag': tag,
+                      'action': action})
+
+    def _git_quiet(self, *args):
+        # Runs a git command that exits non-zero when it finds changes.
+        cmd = ['git']
+        if self.conf.config['deploy.dirty-check-fsmonitor']:
+            cmd.extend(['-c', 'core.fsmonitor=true'])
+        cmd.extend(args)
+        p = subprocess.Popen(cmd, cwd=self.conf.repo.working_dir,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+        err = p.communicate()[1]
+        if p.returncode not in [0, 1]:
+            msg = 'Failed to check for uncommitted changes: {0}'
+            raise TriggerError(msg.format(err.strip()), 162)
+        return p.returncode == 1
+
+    def _has_untracked_files(self):
+        # ls-files finishes walking the work tree before it prints, so
+        # stopping at the first untracked file only saves writing out the
+        # rest of the list, not the scan itself.
+        cmd = ['git', '-c', 'core.untrackedCache=true']
+        if self.conf.config['deploy.dirty-check-fsmonitor']:
+            cmd.extend(['-c', 'core.fsmonitor=true'])
+        cmd.extend(['ls-files', '--others', '--exclude-standard'])
+        p = subprocess.Popen(cmd, cwd=self.conf.repo.working_dir,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE)
+        found = bool(p.stdout.readline())
+        if found:
+            # The exit status of a killed ls-files is expected to be
+            # non-zero, and the file already found makes the tree dirty.
+            p.kill()
+            p.communicate()
+            return True
+        err = p.communicate()[1]
+        if p.returncode != 0:
+            msg = 'Failed to check for untracked files: {0}'
+            raise TriggerError(msg.format(err.strip()), 162)
+        return False
+
+    def _is_dirty(self):
+        strategy = self.conf.config['deploy.dirty-check']
+        start = time.time()
+        if strategy == 'full':
+            dirty = self.conf.repo.is_dirty()
+        elif strategy in ['tracked', 'untracked']:
+            # --quiet makes git stop at the first difference. Staged
+            # changes are checked first, as that doesn't scan the work tree.
+            dirty = (self._git_quiet('diff', '--cached', '--quiet') or
+                     self._git_quiet('diff', '--quiet', 'HEAD', '--'))
+            if not dirty and strategy == 'untracked':
+                dirty = self._has_untracked_files()
+        else:
+            msg = ('Unknown deploy.dirty-check strategy: {0}. Use full,'
+                   ' tracked or untracked.').format(strategy)
+            raise TriggerError(msg, 162)
+        LOG.debug('Dirty check ({0}) took {1:.2f}s'.format(
+            strategy, time.time() - start))
+        return dirty
+
+    def _start_heartbeat(self, args):
+        # Refresh the lock in the background while a long running command
+        # works under it, so that the lock can be detected as stale if the
+        # process dies.
+        try:
+            self._lock_driver.refresh_lock(args)
+        except LockDriverError as e:
+            LOG.warning(e.message)
+        interval = self._lock_driver.heartbeat_interval
+        if not interval:
+            return None
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    self._lock_driver.refresh_lock(args)
+                except LockDriverError as e:
+                    LOG.warning(e.message)
+
+        thread = threading.Thread(target=beat)
+        thread.daemon = True
+        thread.start()
+        return (stop, thread)
+
+    def _stop_heartbeat(self, heartbeat, args):
+        if heartbeat:
+            stop, thread = heartbeat
+            stop.set()
+            thread.join()
+        try:
+            self._lock_driver.detach_lock(args)
+        except LockDriverError as e:
+            LOG.warning(e.message)
 
     def do_finish(self, args):
         """
@@ -170,10 +357,95 @@ class Trigger(object):
             self._lock_driver.remove_lock(args)
         except LockDriverError as e:
             raise TriggerError(e.message, 131)
-        # TODO (ryan-lane): display amount of time of deployment
+        tag = self._get_latest_tag('sync')
+        self._report_timings('finish', tag and tag.name, deployment=True)
         LOG.info('Deployment finished.')
+        self._gc_after_finish()
+
+    def _gc_after_finish(self):
+        if not self.conf.config['deploy.gc-after-finish']:
+            return
+        try:
+            self._prune_tags(self.conf.config['deploy.tag-retention-count'],
+                             self.conf.config['deploy.tag-retention-days'])
+        except TriggerError as e:
+            # The deployment itself succeeded, so don't fail because of gc.
+            LOG.warning(e.message)
+
+    def _get_retention_setting(self, value, key):
+        if value is None:
+            return None
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise TriggerError('{0} must be an integer'.format(key), 240)
+        if value < 0:
+            raise TriggerError('{0} must not be negative'.format(key), 240)
+        return value
+
+    def _prune_tags(self, keep, max_age, dry_run=False):
+        from git import GitCommandError
+
+        keep = self._get_retention_setting(keep,
+                                           'deploy.tag-retention-count')
+        max_age = self._get_retention_setting(max_age,
+                                              'deploy.tag-retention-days')
+        if keep is None and max_age is None:
+            msg = ('No tag retention policy is set. Please set'
+                   ' deploy.tag-retention-count or deploy.tag-retention-days,'
+                   ' or use --keep or --max-age.')
+            raise TriggerError(msg, 240)
+        repo_name = self.conf.config['deploy.repo-name']
+        now = datetime.now()
+        prune = []
+        for tag_type in ['start', 'sync']:
+            pattern = 'refs/tags/{0}-{1}-{2}'.format(repo_name, tag_type,
+                                                     TAG_TIMESTAMP_PATTERN)
+            try:
+                refs = self.conf.repo.git.for_each_ref(pattern,
+                                                       sort='-refname',
+                                                       format='%(refname)')
+            except GitCommandError:
+                raise TriggerError('Failed to list deployment tags.', 241)
+            # The newest tag of each type is always kept, since abort
+            # resets to the latest start tag.
+            for i, ref in enumerate(refs.split()[1:], 1):
+                if keep is not None and i < keep:
+                    continue
+                if max_age is not None:
+                    timestamp = datetime.strptime(ref[-15:], '%Y%m%d-%H%M%S')
+                    if (now - timestamp).days < max_age:
+                        continue
+                prune.append(ref)
+        if dry_run:
+            for ref in prune:
+                LOG.info('Would prune {0}'.format(ref))
+            return prune
+        if prune:
+            # Delete all refs with a single git process, rather than one per
+            # tag.
+            p = subprocess.Popen(['git', 'update-ref', '--stdin'],
+                                 cwd=self.conf.repo.working_dir,
+                                 stdin=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+            err = p.communicate(''.join(['delete {0}\n'.format(ref)
+                                         for ref in prune]))[1]
+            if p.returncode:
+                msg = 'Failed to prune deployment tags: {0}'.format(err)
+                raise TriggerError(msg, 242)
+        try:
+            # Pack the remaining refs and regenerate info/refs, which minions
+            # fetch over dumb http, so that both shrink.
+            self.conf.repo.git.pack_refs('--all', '--prune')
+            self.conf.repo.git.update_server_info()
+        except GitCommandError:
+            raise TriggerError('Failed to compact refs.', 243)
+        LOG.info('Pruned {0} deployment tags.'.format(len(prune)))
+        return prune
 
     def _write_tag(self, tag_type):
+        from git import GitCommandError
+
         #TODO: use a tag driver
         timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
         try:
@@ -195,12 +467,57 @@ class Trigger(object):
             raise TriggerError(msg, 190)
 
     def _get_latest_tag(self, tag_type):
-        tag_filter = '-{0}-'.format(tag_type)
-        tags = filter(lambda k: tag_filter in k.name, self.conf.repo.tags)
-        if len(tags) > 0:
-            return tags[-1]
-        else:
+        from git import GitCommandError
+        from git import TagReference
+
+        # Tags are named <repo>-<type>-<timestamp> with a fixed width
+        # timestamp, so the newest tag sorts last by name. Let git limit the
+        # refs to this repo and type and return only the newest one, rather
+        # than loading every tag. Matching the timestamp exactly keeps repos
+        # with overlapping names (foo vs foo-start) apart.
+        repo_name = self.conf.config['deploy.repo-name']
+        pattern = 'refs/tags/{0}-{1}-{2}'.format(repo_name, tag_type,
+                                                 TAG_TIMESTAMP_PATTERN)
+        try:
+            ref = self.conf.repo.git.for_each_ref(pattern,
+                                                  sort='-refname',
+                                                  count=1,
+                                                  format='%(refname)')
+        except GitCommandError:
+            return None
+        ref = ref.strip()
+        if not ref:
             return None
+        return TagReference(self.conf.repo, ref)
+
+    @utils.arg('--keep',
+               dest='keep',
+               type=int,
+               default=None,
+               help='Number of most recent start and sync tags to keep.'
+                    ' Defaults to deploy.tag-retention-count.')
+    @utils.arg('--max-age',
+               dest='max_age',
+               type=int,
+               default=None,
+               help='Keep start and sync tags newer than this many days.'
+                    ' Defaults to deploy.tag-retention-days.')
+    @utils.arg('--dry-run',
+               dest='dry_run',
+               action='store_true',
+               default=False,
+               help='Only show the tags that would be pruned.')
+    def do_gc(self, args):
+        """
+        Prune old deployment tags according to the retention policy and pack
+        the remaining refs.
+        """
+        keep = args.keep
+        max_age = args.max_age
+        if keep is None and max_age is None:
+            keep = self.conf.config['deploy.tag-retention-count']
+            max_age = self.conf.config['deploy.tag-retention-days']
+        self._prune_tags(keep, max_age, dry_run=args.dry_run)
 
     @utils.arg('action',
                metavar='<action>',
@@ -217,13 +534,27 @@ class Trigger(object):
         # TODO (ryan-lane): Make this more extendable and have the help
         #                   report implemented functions.
         try:
-            getattr(self._service_driver, args.action)(args)
+            with metrics.get_timings().phase(args.action):
+                getattr(self._service_driver, args.action)(args)
         except (AttributeError, NotImplementedError):
             msg = '{0} is not an action implemented by this service driver.'
             msg = msg.format(args.action)
             raise TriggerError(msg, 200)
         except ServiceDriverError as e:
             raise TriggerError(e.message, 201)
+        self._report_timings('service', None)
+
+    def _get_deployed_tag(self):
+        try:
+            deploy_info = self._sync_driver.get_deploy_info()
+            return deploy_info['tag']
+        except SyncDriverError as e:
+            LOG.error(e.message)
+            raise TriggerError('Failed to read deployment file. Has an initial'
+                               ' deploment occurred?.', 211)
+        except KeyError:
+            raise TriggerError('Tag not in deployment file. Has an initial'
+                               ' deploment occurred?.', 212)
 
     @utils.arg('action',
                metavar='<action>',
@@ -233,28 +564,112 @@ class Trigger(object):
                action='store_true',
                default=False,
                help='Show report for all minions rather than a summary')
+    @utils.arg('--watch',
+               dest='watch',
+               action='store_true',
+               default=False,
+               help='Continuously report progress as minions check in')
+    @utils.arg('--pending-only',
+               dest='pending_only',
+               action='store_true',
+               default=False,
+               help='Only show minions that have not completed in detailed'
+                    ' reports')
+    @utils.arg('--status',
+               dest='status',
+               default=None,
+               help='Only show minions with this status in detailed reports')
+    @utils.arg('--limit',
+               dest='limit',
+               type=int,
+               default=None,
+               help='Show at most this many minions in detailed reports')
+    @utils.arg('--sort',
+               dest='sort',
+               choices=['checkin', 'name'],
+               default=None,
+               help='Sort detailed reports by slowest check-in first or by'
+                    ' minion name')
+    @utils.arg('--format',
+               dest='format',
+               choices=['text', 'json', 'ndjson'],
+               default='text',
+               help='Output format. json and ndjson include per-stage status'
+                    ' counts and duration percentiles, and per-minion records'
+                    ' with --detailed')
     def do_report(self, args):
         """
         Report information about this repository's deployments.
         """
-        try:
-            deploy_info = self._sync_driver.get_deploy_info()
-            tag = deploy_info['tag']
-        except SyncDriverError as e:
-            LOG.error(e.message)
-            raise TriggerError('Failed to read deployment file. Has an initial'
-                               ' deploment occurred?.', 211)
-        except KeyError:
-            LOG.error(e.message)
-            raise TriggerError('Tag not in deployment file. Has an initial'
-                               ' deploment occurred?.', 212)
         try:
             if args.action == 'sync':
-                self._report_driver.report_sync(tag, detailed=args.detailed)
+                tag = self._get_deployed_tag()
+                if args.watch:
+                    self._report_driver.watch_sync(tag)
+                else:
+                    self._report_driver.report_sync(
+                        tag,
+                        detailed=args.detailed,
+                        pending_only=args.pending_only,
+                        status=args.status,
+                        limit=args.limit,
+                        sort=args.sort,
+                        output_format=args.format)
+            elif args.action == 'service':
+                try:
+                    since = self._service_driver.get_restart_info()['time']
+                except (ServiceDriverError, NotImplementedError, KeyError):
+                    # Report the last restart of each minion instead.
+                    since = None
+                if args.watch:
+                    self._report_driver.watch_service(since)
+                else:
+                    self._report_driver.report_service(
+                        since,
+                        detailed=args.detailed,
+                        pending_only=args.pending_only,
+                        status=args.status,
+                        limit=args.limit,
+                        sort=args.sort,
+                        output_format=args.format)
+        except NotImplementedError:
+            msg = 'The report driver does not implement this report.'
+            raise TriggerError(msg, 213)
         except ReportDriverError as e:
             LOG.error(e.message)
             raise TriggerError('The reporter failed.', 210)
 
+    @utils.arg('--explain',
+               dest='explain',
+               action='store_true',
+               default=False,
+               help='Show the level each item was loaded from.')
+    def do_config(self, args):
+        """
+        Display the effective configuration, including driver configuration.
+        """
+        for driver in DRIVERS:
+            try:
+                self.conf.drivers[driver]
+            except ConfigurationError as e:
+                # Keep going, so that the whole configuration can be shown.
+                LOG.warning(e.message)
+        for key in sorted(self.conf.config):
+            value = self.conf.config[key]
+            # The output is often pasted into tickets and chat when asking
+            # for help, so don't show secrets such as deploy.redis-password.
+            # Their origin is still shown, to tell where they are set.
+            if value and any(word in key.lower()
+                             for word in SECRET_CONFIG_WORDS):
+                value = '********'
+            if args.explain:
+                origin = self.conf.config_origins.get(key, 'default')
+                LOG.info('{0}={1} ({2})'.format(key, value, origin))
+            else:
+                LOG.info('{0}={1}'.format(key, value))
+        for key in sorted(set(self.conf.get_missing_config())):
+            LOG.info('{0} is required but not set'.format(key))
+
     @utils.arg('command', metavar='<subcommand>', nargs='?',
                help='Display help for <subcommand>.')
     def do_help(self, args):
@@ -271,26 +686,9 @@ class Trigger(object):
             self.parser.print_help()
 
     def _discover_extensions(self):
-        extensions = []
-        for name, module in self._discover_via_extension_path():
-            ext = extension.Extension(name, module)
-            extensions.append(ext)
-
-        return extensions
-
-    def _discover_via_extension_path(self):
         module_path = os.path.dirname(os.path.abspath(__file__))
         ext_path = os.path.join(module_path, 'extensions')
-        ext_glob = os.path.join(ext_path, "*.py")
-
-        for ext_path in glob.iglob(ext_glob):
-            name = os.path.basename(ext_path)[:-3]
-
-            if name == "__init__":
-                continue
-
-            module = imp.load_source(name, ext_path)
-            yield name, module
+        return extension.discover_extensions(ext_path)
 
     def _get_base_parser(self):
         epilog = ('See "{0} help COMMAND" '
@@ -311,33 +709,32 @@ class Trigger(object):
         self.subcommands = {}
         subparsers = parser.add_subparsers(metavar='<subcommand>')
 
-        self._find_actions(subparsers, self)
+        for action in extension.get_actions(self):
+            callback = getattr(self, action['attr'])
+            self._add_action(subparsers, action, callback)
 
         for ext in self.extensions:
-            self._find_actions(subparsers, ext.module)
+            for action in ext.actions:
+                callback = extension.ExtensionAction(ext, action['attr'])
+                self._add_action(subparsers, action, callback)
 
         return parser
 
-    def _find_actions(self, subparsers, actions_module):
-        for attr in (a for a in dir(actions_module) if a.startswith('do_')):
-            # I prefer to be hyphen-separated instead of underscores.
-            command = attr[3:].replace('_', '-')
-            callback = getattr(actions_module, attr)
-            desc = callback.__doc__ or ''
-            action_help = desc.strip()
-            arguments = getattr(callback, 'arguments', [])
-
-            subparser = subparsers.add_parser(command,
-                                              help=action_help,
-                                              description=desc,
-                                              add_help=False)
-            subparser.add_argument('-h', '--help',
-                                   action='help',
-                                   help=argparse.SUPPRESS)
-            self.subcommands[command] = subparser
-            for (args, kwargs) in arguments:
-                subparser.add_argument(*args, **kwargs)
-            subparser.set_defaults(func=callback)
+    def _add_action(self, subparsers, action, callback):
+        command = action['command']
+        subparser = subparsers.add_parser(command,
+                                          help=action['help'],
+                                          description=action['description'],
+                                          add_help=False)
+        subparser.add_argument('-h', '--help',
+                               action='help',
+                               help=argparse.SUPPRESS)
+        self.subcommands[command] = subparser
+        for (args, kwargs) in action['arguments']:
+            # Arguments loaded from the extension manifest have unicode keys
+            kwargs = dict((str(key), value) for key, value in kwargs.items())
+            subparser.add_argument(*args, **kwargs)
+        subparser.set_defaults(func=callback)
 
     def main(self, name, argv):
         # TODO (ryan-lane): Add novaclient's model for hooks
@@ -353,7 +750,11 @@ class Trigger(object):
             self.do_help(args)
             raise SystemExit(0)
         try:
-            self.conf.check_config()
+            if self.conf is None:
+                self.conf = config.Configuration()
+            # The config action reports missing items itself.
+            if args.func != self.do_config:
+                self.conf.check_config()
         except ConfigurationError as e:
             LOG.error(e.message)
             raise SystemExit(e.errorno)
@@ -381,15 +782,15 @@ class Trigger(object):
         except TriggerError as e:
             LOG.error(e.message)
             raise SystemExit(e.errorno)
+        except ConfigurationError as e:
+            # Drivers are loaded, and their configuration checked, on first
+            # use.
+            LOG.error(e.message)
+            raise SystemExit(e.errorno)
 
 
 def main():
-    try:
-        conf = config.Configuration()
-    except ConfigurationError as e:
-        LOG.error(e.message)
-        raise SystemExit(e.errorno)
-    trigger = Trigger(conf)
+    trigger = Trigger()
     trigger.main(sys.argv[0], sys.argv[1:])
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measure the import time of the trigger command-line interface and check
+that heavy modules aren't imported at startup.
+"""
+
+import sys
+import json
+import argparse
+import subprocess
+
+# Modules that should only be imported once a subcommand needs them.
+HEAVY_MODULES = ['git', 'redis', 'yaml']
+
+MEASURE_CODE = '''
+import sys
+import json
+import time
+start = time.time()
+import trigger.shell
+elapsed = time.time() - start
+heavy = [mod for mod in {0!r} if mod in sys.modules]
+sys.stdout.write(json.dumps({{'elapsed': elapsed, 'heavy': heavy}}))
+'''
+
+
+def measure():
+    code = MEASURE_CODE.format(HEAVY_MODULES)
+    p = subprocess.Popen([sys.executable, '-c', code],
+                         stdout=subprocess.PIPE)
+    out = p.communicate()[0]
+    if p.returncode:
+        raise SystemExit('Failed to import trigger.shell')
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--runs',
+                        dest='runs',
+                        type=int,
+                        default=5,
+                        help='Number of fresh interpreters to measure.')
+    parser.add_argument('--max-ms',
+                        dest='max_ms',
+                        type=float,
+                        default=None,
+                        help='Fail if the median import time exceeds this.')
+    args = parser.parse_args()
+    results = [measure() for _ in range(max(args.runs, 1))]
+    times = sorted([result['elapsed'] * 1000 for result in results])
+    median = times[len(times) // 2]
+    print('trigger.shell import time: median {0:.1f}ms, min {1:.1f}ms,'
+          ' max {2:.1f}ms ({3} runs)'.format(median, times[0], times[-1],
+                                             len(times)))
+    failed = False
+    heavy = results[0]['heavy']
+    if heavy:
+        print('Heavy modules imported at startup: {0}'.format(
+            ', '.join(heavy)))
+        failed = True
+    if args.max_ms is not None and median > args.max_ms:
+        print('Import time exceeds {0:g}ms'.format(args.max_ms))
+        failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
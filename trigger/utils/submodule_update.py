@@ -1,17 +1,42 @@
 #!/usr/bin/python
+import os
 import subprocess
 
 
+def get_git_dir(path):
+    """
+    Return the git directory of a submodule checked out at path, following
+    the gitdir link in its .git file.
+    """
+    git_path = os.path.join(path, '.git')
+    if os.path.isdir(git_path):
+        return git_path
+    f = open(git_path, 'r')
+    subgitdir = f.read()
+    f.close()
+    subgitdir = subgitdir.replace('gitdir: ', '').strip()
+    return os.path.normpath(os.path.join(path, subgitdir))
+
+
+def update_server_info(git_dir):
+    """
+    Run git update-server-info in git_dir. Returns the return code and
+    stderr of the command.
+    """
+    p = subprocess.Popen(['git', 'update-server-info'], cwd=git_dir,
+                         stderr=subprocess.PIPE)
+    err = p.communicate()[1]
+    return p.returncode, err
+
+
 def main():
     try:
-        f = open('.git', 'r')
-        subgitdir = f.read()
-        f.close()
+        subgitdir = get_git_dir('.')
     except (IOError, OSError):
         raise SystemExit(1)
-    subgitdir = subgitdir.replace('gitdir: ', '').strip()
-    p = subprocess.Popen(['git','update-server-info'], cwd=subgitdir)
-    p.communicate()
+    returncode, _ = update_server_info(subgitdir)
+    if returncode:
+        raise SystemExit(returncode)
 
 
 if __name__ == "__main__":